@@ -0,0 +1,261 @@
+"""
+Local stand-ins for the pinning services and the JSON-RPC nodes
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+from typing import Any, Dict, Optional
+import uvicorn
+from eth_utils import function_signature_to_4byte_selector, keccak
+from fastapi import FastAPI, Request, Response, WebSocket
+from ..mint.cid import get_ipfs_cid
+from ..mint.config import IPFS_CHUNK_SIZE, IPFS_MAX_LINKS
+
+IS_VERIFIED_USER_SELECTOR: bytes = function_signature_to_4byte_selector(
+    "isVerifiedUser(address)"
+)
+
+TOKEN_ATTRIBUTE_EXISTS_SELECTOR: bytes = function_signature_to_4byte_selector(
+    "tokenAttributeExists(bytes32)"
+)
+
+GET_TOKEN_URI_AND_ATTRIBUTE_HASH_SELECTOR: bytes = function_signature_to_4byte_selector(
+    "getTokenURIAndAttributeHash(address,bytes32,bytes32)"
+)
+
+TRUE_WORD: str = "0x" + "0" * 63 + "1"
+
+FALSE_WORD: str = "0x" + "0" * 64
+
+
+class FakeBehaviour:
+    """
+    Artificial latency and error rate of a fake service, with call counters
+    """
+
+    def __init__(self, latency: float, jitter: float, error_rate: float, seed: int):
+        self.latency: float = latency
+        self.jitter: float = jitter
+        self.error_rate: float = error_rate
+        self.calls: int = 0
+        self.errors: int = 0
+        self._random: random.Random = random.Random(seed)
+
+    async def delay(self) -> bool:
+        """
+        Wait out the artificial latency and decide if this call fails
+        """
+
+        self.calls += 1
+
+        seconds: float = self.latency + self._random.uniform(0, self.jitter)
+
+        if seconds > 0:
+            await asyncio.sleep(seconds)
+
+        if self._random.random() < self.error_rate:
+            self.errors += 1
+            return False
+
+        return True
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get call and error counts
+        """
+
+        return {"calls": self.calls, "errors": self.errors}
+
+
+def get_multipart_file(body: bytes, content_type: str) -> bytes:
+    """
+    Get the content of the part named file from a multipart form body
+    """
+
+    boundary: bytes = content_type.split("boundary=")[-1].strip('"').encode("utf-8")
+
+    for part in body.split(b"--" + boundary):
+        headers, _, content = part.partition(b"\r\n\r\n")
+
+        if b'name="file"' in headers:
+            return content.removesuffix(b"\r\n")
+
+    raise ValueError("Missing file part")
+
+
+def create_pinning_app(behaviour: FakeBehaviour) -> FastAPI:
+    """
+    Create a fake serving the Pinata and NFT.Storage endpoints the API uses
+    """
+
+    fake = FastAPI()
+
+    @fake.post("/pinning/pinFileToIPFS")
+    async def pin_file_to_ipfs(request: Request):
+        body: bytes = await request.body()
+
+        if await behaviour.delay() is False:
+            return Response(status_code=500, content='{"error": "fake failure"}')
+
+        data: bytes = get_multipart_file(body, request.headers["content-type"])
+
+        return {
+            "IpfsHash": get_ipfs_cid(data, IPFS_CHUNK_SIZE, IPFS_MAX_LINKS),
+            "PinSize": len(data),
+        }
+
+    @fake.get("/data/pinList")
+    async def pin_list():
+        await behaviour.delay()
+
+        return {"count": 0, "rows": []}
+
+    @fake.post("/upload")
+    async def upload(request: Request):
+        data: bytes = await request.body()
+
+        if await behaviour.delay() is False:
+            return Response(status_code=500, content='{"ok": false}')
+
+        return {
+            "ok": True,
+            "value": {"cid": get_ipfs_cid(data, IPFS_CHUNK_SIZE, IPFS_MAX_LINKS)},
+        }
+
+    # The path parameter is only routed, every hash is reported as unpinned
+    @fake.get("/check/{ipfs_hash}")
+    async def check(ipfs_hash: str):  # pylint: disable=unused-argument
+        await behaviour.delay()
+
+        return Response(status_code=404, content='{"ok": false}')
+
+    return fake
+
+
+def call_fake_contract(data: bytes) -> str:
+    """
+    Answer an eth_call to the verification or mint contract
+
+    Every address is verified, no attribute combination exists yet, and
+    getTokenURIAndAttributeHash matches the packed local hash.
+    """
+
+    selector: bytes = data[:4]
+    words: bytes = data[4:]
+
+    if selector == IS_VERIFIED_USER_SELECTOR:
+        return TRUE_WORD
+
+    if selector == TOKEN_ATTRIBUTE_EXISTS_SELECTOR:
+        return FALSE_WORD
+
+    if selector == GET_TOKEN_URI_AND_ATTRIBUTE_HASH_SELECTOR:
+        return "0x" + keccak(words[12:32] + words[32:96]).hex().removeprefix("0x")
+
+    raise ValueError(f"Unknown selector 0x{selector.hex()}")
+
+
+async def handle_rpc(behaviour: FakeBehaviour, message: Dict[str, Any]) -> Dict:
+    """
+    Answer a single JSON-RPC request
+    """
+
+    response: Dict[str, Any] = {"jsonrpc": "2.0", "id": message.get("id")}
+
+    if await behaviour.delay() is False:
+        response["error"] = {"code": -32000, "message": "fake failure"}
+        return response
+
+    method: str = message.get("method", "")
+    params: Any = message.get("params", [])
+
+    try:
+        if method == "eth_call":
+            response["result"] = call_fake_contract(
+                bytes.fromhex(params[0]["data"].removeprefix("0x"))
+            )
+        elif method == "eth_chainId":
+            response["result"] = "0x539"
+        elif method == "net_version":
+            response["result"] = "1337"
+        elif method == "web3_clientVersion":
+            response["result"] = "fake/1.0"
+        elif method == "eth_blockNumber":
+            response["result"] = "0x1"
+        elif method == "eth_getLogs":
+            response["result"] = []
+        else:
+            response["error"] = {"code": -32601, "message": f"Unknown {method}"}
+    except Exception as error:
+        response["error"] = {"code": -32602, "message": str(error)}
+
+    return response
+
+
+def create_rpc_app(behaviour: FakeBehaviour) -> FastAPI:
+    """
+    Create a fake JSON-RPC node, over both HTTP and websocket
+    """
+
+    fake = FastAPI()
+
+    @fake.post("/")
+    async def rpc_http(request: Request):
+        return await handle_rpc(behaviour, json.loads(await request.body()))
+
+    @fake.websocket("/")
+    async def rpc_websocket(websocket: WebSocket):
+        await websocket.accept()
+
+        while True:
+            frame: Dict[str, Any] = await websocket.receive()
+
+            if frame["type"] == "websocket.disconnect":
+                return
+
+            # Clients may send requests as text or binary frames
+            message: Dict[str, Any] = json.loads(frame.get("text") or frame["bytes"])
+
+            await websocket.send_text(json.dumps(await handle_rpc(behaviour, message)))
+
+    return fake
+
+
+class FakeServer:
+    """
+    Serve a fake on a local port from a background thread
+    """
+
+    def __init__(self, fake: FastAPI, port: int):
+        self.port: int = port
+        self.server: uvicorn.Server = uvicorn.Server(
+            uvicorn.Config(fake, host="127.0.0.1", port=port, log_level="warning")
+        )
+        self.thread: Optional[threading.Thread] = None
+
+    def start(self):
+        """
+        Start serving and wait until the port is accepting connections
+        """
+
+        self.thread = threading.Thread(target=self.server.run, daemon=True)
+        self.thread.start()
+
+        while self.server.started is False:
+            if self.thread.is_alive() is False:
+                raise Exception(f"Fake server failed to start on port {self.port}")
+
+            time.sleep(0.05)
+
+    def stop(self):
+        """
+        Stop serving
+        """
+
+        self.server.should_exit = True
+
+        if self.thread is not None:
+            self.thread.join(timeout=5)
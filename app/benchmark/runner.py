@@ -0,0 +1,444 @@
+"""
+Drive the API against local stand-ins and report latency and throughput
+"""
+
+import asyncio
+import json
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Dict, List, Optional, TypedDict
+import httpx
+from ..mint.catalog import get_catalog
+from ..mint.typings import InputTraits
+from ..web3_providers import to_checksum_address
+from .fakes import FakeBehaviour, FakeServer, create_pinning_app, create_rpc_app
+
+BENCHMARK_CONTRACT_ADDRESS: str = "0x000000000000000000000000000000000000BE11"
+
+# Well known throwaway key, never used outside local benchmarks
+BENCHMARK_SIGNER_PRIVATE_KEY: str = "0x" + "11" * 32
+
+
+class BenchmarkOptions(TypedDict):
+    requests: int
+    concurrency: int
+    method: str
+    workers: int
+    seed: int
+    pinning: str
+    pin_latency: float
+    pin_error_rate: float
+    rpc_latency: float
+    rpc_error_rate: float
+    jitter: float
+    env: Dict[str, str]
+    app_log: Optional[str]
+
+
+class RequestResult(TypedDict):
+    method: str
+    status: int
+    seconds: float
+    stages: Dict[str, float]
+
+
+def get_free_port() -> int:
+    """
+    Get a local port that is free right now
+    """
+
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+def get_percentile(values: List[float], percentile: float) -> float:
+    """
+    Get a nearest rank percentile of unsorted values
+    """
+
+    if len(values) == 0:
+        return 0.0
+
+    ordered: List[float] = sorted(values)
+
+    return ordered[max(0, math.ceil(percentile / 100 * len(ordered)) - 1)]
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    """
+    Summarize latencies in milliseconds
+    """
+
+    return {
+        "p50": round(get_percentile(values, 50) * 1000, 2),
+        "p95": round(get_percentile(values, 95) * 1000, 2),
+        "p99": round(get_percentile(values, 99) * 1000, 2),
+        "mean": round(sum(values) / max(len(values), 1) * 1000, 2),
+        "max": round(max(values, default=0.0) * 1000, 2),
+    }
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    """
+    Parse a Server-Timing header into stage seconds
+    """
+
+    stages: Dict[str, float] = {}
+
+    for metric in header.split(","):
+        name, _, params = metric.strip().partition(";")
+
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+
+            if name != "" and key == "dur":
+                stages[name] = float(value) / 1000
+
+    return stages
+
+
+def get_app_env(
+    options: BenchmarkOptions,
+    pinning_url: str,
+    rpc_port: int,
+    publish_cache_path: str,
+) -> Dict[str, str]:
+    """
+    Get the environment the API runs under, pointed at the stand-ins
+    """
+
+    use_pinata: bool = options["pinning"] == "pinata"
+
+    return {
+        **os.environ,
+        "PINATA_JWT": "benchmark" if use_pinata else "",
+        "NFT_STORAGE_JWT": "" if use_pinata else "benchmark",
+        "PINATA_API_URL": pinning_url,
+        "NFT_STORAGE_API_URL": pinning_url,
+        "MINT_RPC_URL": f"http://127.0.0.1:{rpc_port}/",
+        "MINT_CONTRACT_ADDRESS": BENCHMARK_CONTRACT_ADDRESS,
+        "MINT_SIGNER_PRIVATE_KEY": BENCHMARK_SIGNER_PRIVATE_KEY,
+        "MINT_HASH_ENCODING": "packed",
+        "MINT_INDEX_ENABLED": "false",
+        "VERIFICATION_RPC_URL": f"ws://127.0.0.1:{rpc_port}/",
+        "VERIFICATION_CONTRACT_ADDRESS": BENCHMARK_CONTRACT_ADDRESS,
+        "VERIFICATION_CACHE_SHARED_PATH": "",
+        "PUBLISH_CACHE_PATH": publish_cache_path,
+        "PUBLISH_ARCHIVE": "off",
+        "PRERENDER_ENABLED": "false",
+        "SERVER_TIMING": "true",
+        **options["env"],
+    }
+
+
+def get_random_input_traits(generator: random.Random) -> InputTraits:
+    """
+    Get a random option name for every layer
+    """
+
+    return {
+        layer["name"]: generator.choice(layer["options"])["name"]
+        for layer in get_catalog().layers
+        if len(layer["options"]) > 0
+    }
+
+
+async def send_mint_request(
+    client: httpx.AsyncClient,
+    url: str,
+    method: str,
+    address: str,
+    input_traits: InputTraits,
+) -> RequestResult:
+    """
+    Send one mint request and time it
+    """
+
+    started_at: float = time.perf_counter()
+
+    try:
+        if method == "get":
+            response: httpx.Response = await client.get(
+                url,
+                params={"address": address, "traits": json.dumps(input_traits)},
+            )
+        else:
+            response = await client.post(
+                url,
+                json={"address": address, "traits": input_traits},
+            )
+    except httpx.HTTPError:
+        return {
+            "method": method,
+            "status": 0,
+            "seconds": time.perf_counter() - started_at,
+            "stages": {},
+        }
+
+    return {
+        "method": method,
+        "status": response.status_code,
+        "seconds": time.perf_counter() - started_at,
+        "stages": parse_server_timing(response.headers.get("server-timing", "")),
+    }
+
+
+async def drive_load(
+    options: BenchmarkOptions,
+    url: str,
+) -> List[RequestResult]:
+    """
+    Send the configured requests with a fixed number in flight
+    """
+
+    generator: random.Random = random.Random(options["seed"])
+
+    # Draw every request up front so runs with the same seed match
+    planned = [
+        (
+            (
+                generator.choice(["get", "post"])
+                if options["method"] == "mixed"
+                else options["method"]
+            ),
+            to_checksum_address("0x" + generator.randbytes(20).hex()),
+            get_random_input_traits(generator),
+        )
+        for _ in range(options["requests"])
+    ]
+
+    results: List[RequestResult] = []
+    next_index: int = 0
+
+    async with httpx.AsyncClient(
+        timeout=httpx.Timeout(120.0),
+        limits=httpx.Limits(max_connections=options["concurrency"]),
+    ) as client:
+
+        async def run_client():
+            nonlocal next_index
+
+            while next_index < len(planned):
+                method, address, input_traits = planned[next_index]
+                next_index += 1
+
+                results.append(
+                    await send_mint_request(
+                        client,
+                        url,
+                        method,
+                        address,
+                        input_traits,
+                    )
+                )
+
+        await asyncio.gather(*[run_client() for _ in range(options["concurrency"])])
+
+    return results
+
+
+async def wait_for_app(url: str, app_process: subprocess.Popen, timeout: float):
+    """
+    Wait until the API answers its index route
+    """
+
+    deadline: float = time.monotonic() + timeout
+
+    async with httpx.AsyncClient(timeout=1.0) as client:
+        while time.monotonic() < deadline:
+            if app_process.poll() is not None:
+                raise Exception("API exited during startup, see --app-log")
+
+            try:
+                if (await client.get(url)).status_code == 200:
+                    return
+            except httpx.HTTPError:
+                pass
+
+            await asyncio.sleep(0.2)
+
+    raise Exception("API did not start in time")
+
+
+def build_report(
+    options: BenchmarkOptions,
+    results: List[RequestResult],
+    seconds: float,
+    fakes: Dict[str, FakeBehaviour],
+) -> Dict[str, Any]:
+    """
+    Summarize request results into a JSON serializable report
+    """
+
+    succeeded: List[RequestResult] = [
+        result for result in results if result["status"] == 200
+    ]
+
+    stage_names: List[str] = sorted(
+        {name for result in succeeded for name in result["stages"]}
+    )
+
+    return {
+        "options": options,
+        "requests": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "seconds": round(seconds, 3),
+        "throughput": round(len(succeeded) / seconds, 2) if seconds > 0 else 0.0,
+        "latency_ms": summarize([result["seconds"] for result in succeeded]),
+        "stages_ms": {
+            name: summarize(
+                [
+                    result["stages"][name]
+                    for result in succeeded
+                    if name in result["stages"]
+                ]
+            )
+            for name in stage_names
+        },
+        "fakes": {name: behaviour.stats() for name, behaviour in fakes.items()},
+    }
+
+
+def run_benchmark(options: BenchmarkOptions) -> Dict[str, Any]:
+    """
+    Boot the stand-ins and the API, drive load and report
+    """
+
+    fakes: Dict[str, FakeBehaviour] = {
+        "pinning": FakeBehaviour(
+            options["pin_latency"],
+            options["jitter"],
+            options["pin_error_rate"],
+            options["seed"],
+        ),
+        "rpc": FakeBehaviour(
+            options["rpc_latency"],
+            options["jitter"],
+            options["rpc_error_rate"],
+            options["seed"] + 1,
+        ),
+    }
+
+    pinning_server: FakeServer = FakeServer(
+        create_pinning_app(fakes["pinning"]),
+        get_free_port(),
+    )
+    rpc_server: FakeServer = FakeServer(create_rpc_app(fakes["rpc"]), get_free_port())
+
+    app_port: int = get_free_port()
+    url_prefix: str = os.environ.get("URL_PREFIX", "")
+
+    with tempfile.TemporaryDirectory() as temporary_path:
+        app_log_path: str = options["app_log"] or os.devnull
+
+        pinning_server.start()
+        rpc_server.start()
+
+        with open(app_log_path, "ab") as app_log:
+            app_process: subprocess.Popen = subprocess.Popen(
+                [
+                    sys.executable,
+                    "-m",
+                    "uvicorn",
+                    "app.main:app",
+                    "--host",
+                    "127.0.0.1",
+                    "--port",
+                    str(app_port),
+                    "--workers",
+                    str(options["workers"]),
+                    "--log-level",
+                    "warning",
+                ],
+                env=get_app_env(
+                    options,
+                    f"http://127.0.0.1:{pinning_server.port}",
+                    rpc_server.port,
+                    f"{temporary_path}/publish_cache.sqlite3",
+                ),
+                stdout=app_log,
+                stderr=subprocess.STDOUT,
+            )
+
+            try:
+                base_url: str = f"http://127.0.0.1:{app_port}{url_prefix}"
+
+                asyncio.run(wait_for_app(f"{base_url}/", app_process, 60.0))
+
+                started_at: float = time.perf_counter()
+                results: List[RequestResult] = asyncio.run(
+                    drive_load(options, f"{base_url}/mint/")
+                )
+                seconds: float = time.perf_counter() - started_at
+            finally:
+                app_process.terminate()
+                app_process.wait(timeout=30)
+                pinning_server.stop()
+                rpc_server.stop()
+
+    return build_report(options, results, seconds, fakes)
+
+
+def compare_reports(report: Dict[str, Any], baseline: Dict[str, Any]) -> List[str]:
+    """
+    Describe how a report's headline numbers moved against a baseline
+    """
+
+    lines: List[str] = []
+
+    def describe(label: str, value: float, baseline_value: float):
+        change: str = (
+            f"{(value - baseline_value) / baseline_value:+.1%}"
+            if baseline_value
+            else "n/a"
+        )
+        lines.append(f"{label:<24} {baseline_value:>10} -> {value:>10} ({change})")
+
+    describe("throughput", report["throughput"], baseline["throughput"])
+
+    for key in ["p50", "p95", "p99"]:
+        describe(
+            f"latency {key} ms",
+            report["latency_ms"][key],
+            baseline["latency_ms"][key],
+        )
+
+    for name, stage in report["stages_ms"].items():
+        if name in baseline["stages_ms"]:
+            describe(f"{name} p50 ms", stage["p50"], baseline["stages_ms"][name]["p50"])
+
+    return lines
+
+
+def format_report(report: Dict[str, Any]) -> List[str]:
+    """
+    Describe a report as lines of text
+    """
+
+    latency: Dict[str, float] = report["latency_ms"]
+
+    lines: List[str] = [
+        f"{report['succeeded']} of {report['requests']} requests succeeded "
+        f"in {report['seconds']}s, {report['throughput']} requests/s",
+        f"latency ms: p50 {latency['p50']} p95 {latency['p95']} "
+        f"p99 {latency['p99']} max {latency['max']}",
+        f"{'stage':<16} {'p50 ms':>10} {'p95 ms':>10} {'p99 ms':>10}",
+    ]
+
+    for name, stage in report["stages_ms"].items():
+        lines.append(
+            f"{name:<16} {stage['p50']:>10} {stage['p95']:>10} {stage['p99']:>10}"
+        )
+
+    for name, stats in report["fakes"].items():
+        lines.append(f"fake {name}: {stats['calls']} calls, {stats['errors']} errors")
+
+    return lines
@@ -0,0 +1,109 @@
+"""
+Thread-safe, size-bounded LRU cache
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Generic, Hashable, Optional, Tuple, TypeVar
+
+V = TypeVar("V")
+
+
+class LRUCache(Generic[V]):
+    """
+    Least recently used cache bounded by the total size of its entries
+
+    Entries may also be given a time to live, after which they are misses.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size: int = max_size
+        self.size: int = 0
+        self.hits: int = 0
+        self.misses: int = 0
+        self.evictions: int = 0
+
+        # key -> (value, size, expires at)
+        self._entries: OrderedDict[Hashable, Tuple[V, int, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Optional[V]:
+        """
+        Get a cached value, marking it as most recently used
+        """
+
+        with self._lock:
+            entry: Optional[Tuple[V, int, float]] = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            if entry[2] < time.monotonic():
+                del self._entries[key]
+                self.size -= entry[1]
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[0]
+
+    def set(
+        self,
+        key: Hashable,
+        value: V,
+        size: int = 1,
+        ttl: Optional[float] = None,
+    ):
+        """
+        Cache a value, evicting least recently used entries to make room
+        """
+
+        # Never let a single oversized entry flush the whole cache
+        if size > self.max_size:
+            return
+
+        expires_at: float = float("inf") if ttl is None else time.monotonic() + ttl
+
+        with self._lock:
+            previous: Optional[Tuple[V, int, float]] = self._entries.pop(key, None)
+
+            if previous is not None:
+                self.size -= previous[1]
+
+            self._entries[key] = (value, size, expires_at)
+            self.size += size
+
+            while self.size > self.max_size:
+                _, (_, evicted_size, _) = self._entries.popitem(last=False)
+                self.size -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Remove all cached values
+        """
+
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get cache usage counters
+        """
+
+        return {
+            "entries": len(self._entries),
+            "size": self.size,
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,454 @@
+"""
+Maintenance commands
+
+Usage: python -m app.cli <command>
+"""
+
+import argparse
+import json
+import random
+import sys
+import time
+from typing import Any, Callable, Dict, List
+from PIL import Image
+from .logs import configure_logging
+from .mint.asset_pack import AssetPackResult, build_asset_pack
+from .mint.catalog import LayerCatalog, get_catalog
+from .mint.config import ARCHIVE_KEEP_LATEST, ARCHIVE_MAX_AGE, ARCHIVE_MAX_BYTES
+from .mint.compositing import (
+    composite_traits,
+    composite_traits_with_numpy,
+    composite_traits_with_pillow,
+)
+from .mint.encoding import PNG_PROFILES, encode_png
+from .mint.preprocess import PreprocessResult, preprocess_layers
+from .mint.retention import SweepResult, sweep_archive
+from .mint.typings import Trait, Traits
+
+
+def get_default_traits(catalog: LayerCatalog) -> Traits:
+    """
+    Get a trait for each layer using the layer's default option
+    """
+
+    traits: Traits = []
+
+    for layer in catalog.layers:
+        if len(layer["options"]) == 0:
+            continue
+
+        trait: Trait = {
+            "id": layer["id"],
+            "name": layer["name"],
+            "display": layer["display"],
+            "option": catalog.options_by_name.get(
+                (layer["name"].lower(), layer["default"].lower()),
+                layer["options"][0],
+            ),
+        }
+
+        traits.append(trait)
+
+    traits.sort(key=lambda trait: trait["id"])
+
+    return traits
+
+
+def get_catalog_trait_sets(catalog: LayerCatalog) -> List[Traits]:
+    """
+    Get the default trait set with each catalog option swapped in, in turn
+    """
+
+    default_traits: Traits = get_default_traits(catalog)
+
+    trait_sets: List[Traits] = []
+
+    for index, default_trait in enumerate(default_traits):
+        layer = catalog.get_layer(default_trait["name"])
+
+        for option in layer["options"]:
+            traits: Traits = list(default_traits)
+            traits[index] = {**default_trait, "option": option}
+            trait_sets.append(traits)
+
+    return trait_sets
+
+
+def get_random_trait_sets(
+    catalog: LayerCatalog,
+    count: int,
+    seed: int,
+) -> List[Traits]:
+    """
+    Get a reproducible sample of random trait combinations
+    """
+
+    generator: random.Random = random.Random(seed)
+
+    trait_sets: List[Traits] = []
+
+    for _ in range(count):
+        traits: Traits = []
+
+        for layer in catalog.layers:
+            if len(layer["options"]) == 0:
+                continue
+
+            traits.append(
+                {
+                    "id": layer["id"],
+                    "name": layer["name"],
+                    "display": layer["display"],
+                    "option": generator.choice(layer["options"]),
+                }
+            )
+
+        traits.sort(key=lambda trait: trait["id"])
+        trait_sets.append(traits)
+
+    return trait_sets
+
+
+def verify_compositing(_: argparse.Namespace) -> int:
+    """
+    Check that the NumPy engine matches the Pillow engine for every option
+    """
+
+    catalog: LayerCatalog = get_catalog()
+
+    failures: int = 0
+    trait_sets: List[Traits] = get_catalog_trait_sets(catalog)
+
+    for traits in trait_sets:
+        pillow_bytes: bytes = composite_traits_with_pillow(traits).tobytes()
+        numpy_bytes: bytes = composite_traits_with_numpy(traits).tobytes()
+
+        if pillow_bytes != numpy_bytes:
+            failures += 1
+            options: str = ", ".join(
+                f"{trait['name']}={trait['option']['name']}" for trait in traits
+            )
+            print(f"Mismatch: {options}")
+
+    print(f"Compared {len(trait_sets)} combinations, {failures} mismatched")
+
+    return 1 if failures > 0 else 0
+
+
+def compact_archive(args: argparse.Namespace) -> int:
+    """
+    Apply the archive retention limits to the existing output folders
+    """
+
+    result: SweepResult = sweep_archive(
+        max_bytes=args.max_bytes,
+        max_age=args.max_age,
+        keep_latest=args.keep_latest,
+        dry_run=args.dry_run,
+    )
+
+    action: str = "Would delete" if args.dry_run else "Deleted"
+
+    print(
+        f"{action} {result['deleted_runs']} of {result['runs']} folders, "
+        f"{result['deleted_bytes']} of {result['bytes']} bytes"
+    )
+
+    return 0
+
+
+def benchmark_png(args: argparse.Namespace) -> int:
+    """
+    Report encode time and size per PNG profile over sample combinations
+    """
+
+    images: List[Image.Image] = [
+        composite_traits(traits)
+        for traits in get_random_trait_sets(get_catalog(), args.samples, args.seed)
+    ]
+
+    print(f"{'profile':<10} {'encode ms':>10} {'bytes':>10}")
+
+    for profile in PNG_PROFILES:
+        seconds: float = 0.0
+        size: int = 0
+
+        for image in images:
+            started_at: float = time.perf_counter()
+            size += len(encode_png(image, profile))
+            seconds += time.perf_counter() - started_at
+
+        print(
+            f"{profile:<10} "
+            f"{seconds / len(images) * 1000:>10.1f} "
+            f"{size // len(images):>10}"
+        )
+
+    return 0
+
+
+def preprocess_layer_assets(args: argparse.Namespace) -> int:
+    """
+    Crop every catalog layer to its visible pixels for faster compositing
+    """
+
+    result: PreprocessResult = preprocess_layers(force=args.force)
+
+    ratio: float = result["cropped_pixels"] / max(result["source_pixels"], 1)
+
+    print(
+        f"Preprocessed {result['layers']} layers "
+        f"({result['converted']} converted, {result['skipped']} unchanged), "
+        f"cropped to {ratio:.1%} of the source pixels"
+    )
+
+    return 0
+
+
+def build_layer_asset_pack(_: argparse.Namespace) -> int:
+    """
+    Compile every catalog layer into a memory-mappable asset pack
+    """
+
+    started_at: float = time.perf_counter()
+
+    result: AssetPackResult = build_asset_pack()
+
+    print(
+        f"Packed {result['layers']} layers into {result['pack_bytes']} bytes "
+        f"({result['pixel_bytes']} bytes of pixels) "
+        f"in {time.perf_counter() - started_at:.2f}s"
+    )
+
+    return 0
+
+
+def benchmark_api(args: argparse.Namespace) -> int:
+    """
+    Load the API against local stand-ins and report latency per stage
+    """
+
+    # Pulls in uvicorn and the fake services, which only this command needs
+    # pylint: disable=import-outside-toplevel
+    from .benchmark.runner import (
+        BenchmarkOptions,
+        compare_reports,
+        format_report,
+        run_benchmark,
+    )
+
+    options: BenchmarkOptions = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "method": args.method,
+        "workers": args.workers,
+        "seed": args.seed,
+        "pinning": args.pinning,
+        "pin_latency": args.pin_latency,
+        "pin_error_rate": args.pin_error_rate,
+        "rpc_latency": args.rpc_latency,
+        "rpc_error_rate": args.rpc_error_rate,
+        "jitter": args.jitter,
+        "env": dict(item.split("=", 1) for item in args.env),
+        "app_log": args.app_log,
+    }
+
+    report: Dict[str, Any] = run_benchmark(options)
+
+    print("\n".join(format_report(report)))
+
+    if args.output is not None:
+        with open(args.output, "w", encoding="utf-8") as outfile:
+            json.dump(report, outfile, indent=2)
+
+    if args.compare is not None:
+        with open(args.compare, "r", encoding="utf-8") as infile:
+            baseline: Dict[str, Any] = json.load(infile)
+
+        print("\n".join(compare_reports(report, baseline)))
+
+    return 0 if report["succeeded"] > 0 else 1
+
+
+COMMANDS: Dict[str, Callable[[argparse.Namespace], int]] = {
+    "verify-compositing": verify_compositing,
+    "compact-archive": compact_archive,
+    "benchmark-png": benchmark_png,
+    "preprocess-layers": preprocess_layer_assets,
+    "build-asset-pack": build_layer_asset_pack,
+    "benchmark-api": benchmark_api,
+}
+
+
+def main() -> int:
+    """
+    Run a maintenance command
+    """
+
+    parser = argparse.ArgumentParser(prog="python -m app.cli")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    subparsers.add_parser(
+        "verify-compositing",
+        help="check the numpy compositing engine against pillow",
+    )
+
+    compact_archive_parser = subparsers.add_parser(
+        "compact-archive",
+        help="delete archived output beyond the retention limits",
+    )
+    compact_archive_parser.add_argument(
+        "--max-bytes",
+        type=int,
+        default=ARCHIVE_MAX_BYTES,
+        help="total archive size to keep, 0 for no limit",
+    )
+    compact_archive_parser.add_argument(
+        "--max-age",
+        type=float,
+        default=ARCHIVE_MAX_AGE,
+        help="seconds to keep each folder, 0 for no limit",
+    )
+    compact_archive_parser.add_argument(
+        "--keep-latest",
+        type=int,
+        default=ARCHIVE_KEEP_LATEST,
+        help="folders to keep per traits hex, 0 for no limit",
+    )
+    compact_archive_parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="report what would be deleted without deleting it",
+    )
+
+    benchmark_png_parser = subparsers.add_parser(
+        "benchmark-png",
+        help="compare encode time and size of the PNG profiles",
+    )
+    benchmark_png_parser.add_argument(
+        "--samples",
+        type=int,
+        default=20,
+        help="random trait combinations to encode",
+    )
+    benchmark_png_parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="seed for choosing trait combinations",
+    )
+
+    preprocess_layers_parser = subparsers.add_parser(
+        "preprocess-layers",
+        help="crop layer assets to their visible pixels",
+    )
+    preprocess_layers_parser.add_argument(
+        "--force",
+        action="store_true",
+        help="reprocess layers even when their source is unchanged",
+    )
+
+    subparsers.add_parser(
+        "build-asset-pack",
+        help="compile layer assets into a memory-mappable pack",
+    )
+
+    benchmark_api_parser = subparsers.add_parser(
+        "benchmark-api",
+        help="load the mint routes against local pinning and RPC stand-ins",
+    )
+    benchmark_api_parser.add_argument(
+        "--requests",
+        type=int,
+        default=200,
+        help="mint requests to send",
+    )
+    benchmark_api_parser.add_argument(
+        "--concurrency",
+        type=int,
+        default=10,
+        help="requests in flight at once",
+    )
+    benchmark_api_parser.add_argument(
+        "--method",
+        choices=["get", "post", "mixed"],
+        default="mixed",
+        help="mint route method",
+    )
+    benchmark_api_parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="API worker processes",
+    )
+    benchmark_api_parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="seed for addresses, trait combinations and fake failures",
+    )
+    benchmark_api_parser.add_argument(
+        "--pinning",
+        choices=["pinata", "nft-storage"],
+        default="pinata",
+        help="pinning service the API is configured for",
+    )
+    benchmark_api_parser.add_argument(
+        "--pin-latency",
+        type=float,
+        default=0.2,
+        help="seconds each fake pinning call takes",
+    )
+    benchmark_api_parser.add_argument(
+        "--pin-error-rate",
+        type=float,
+        default=0.0,
+        help="fraction of fake pinning calls that fail",
+    )
+    benchmark_api_parser.add_argument(
+        "--rpc-latency",
+        type=float,
+        default=0.05,
+        help="seconds each fake JSON-RPC call takes",
+    )
+    benchmark_api_parser.add_argument(
+        "--rpc-error-rate",
+        type=float,
+        default=0.0,
+        help="fraction of fake JSON-RPC calls that fail",
+    )
+    benchmark_api_parser.add_argument(
+        "--jitter",
+        type=float,
+        default=0.0,
+        help="extra random seconds added to each fake call",
+    )
+    benchmark_api_parser.add_argument(
+        "--env",
+        action="append",
+        default=[],
+        metavar="NAME=VALUE",
+        help="extra environment for the API, repeatable",
+    )
+    benchmark_api_parser.add_argument(
+        "--app-log",
+        help="file to append the API's output to",
+    )
+    benchmark_api_parser.add_argument(
+        "--output",
+        help="file to save the JSON report to",
+    )
+    benchmark_api_parser.add_argument(
+        "--compare",
+        help="JSON report of an earlier run to compare against",
+    )
+
+    args: argparse.Namespace = parser.parse_args()
+
+    configure_logging()
+
+    return COMMANDS[args.command](args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
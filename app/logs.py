@@ -0,0 +1,147 @@
+"""
+Structured logging, written to stdout from a background thread
+
+Records are handed to a queue on the logging thread and formatted and
+written by a listener thread, so log I/O never blocks a request. Every
+record carries the correlation ID of the request that logged it.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+from contextvars import ContextVar
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+LOG_LEVEL = os.environ.get("LOG_LEVEL", "INFO").upper()
+
+LOG_FORMAT = os.environ.get("LOG_FORMAT", "json").lower()
+
+# Correlation ID of the current request, shared by every task it starts
+request_id: ContextVar[str] = ContextVar("request_id", default="-")
+
+_queue_handler: Optional[QueueHandler] = None
+
+_listener: Optional[QueueListener] = None
+
+
+class RequestIdFilter(logging.Filter):
+    """
+    Tag records with the current request's correlation ID
+    """
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id.get()
+
+        return True
+
+
+def get_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    """
+    Get the structured fields passed to a log call as extra={"fields": ...}
+    """
+
+    fields: Optional[Dict[str, Any]] = getattr(record, "fields", None)
+
+    return fields if fields is not None else {}
+
+
+class JsonFormatter(logging.Formatter):
+    """
+    Format records as single line JSON objects
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "request_id": getattr(record, "request_id", "-"),
+            "message": record.getMessage(),
+            **get_fields(record),
+        }
+
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """
+    Format records as readable lines, with fields as trailing JSON
+    """
+
+    def __init__(self):
+        super().__init__(
+            "%(asctime)s %(levelname)s %(name)s [%(request_id)s] %(message)s"
+        )
+
+    def format(self, record: logging.LogRecord) -> str:
+        line: str = super().format(record)
+        fields: Dict[str, Any] = get_fields(record)
+
+        if len(fields) == 0:
+            return line
+
+        return f"{line} {json.dumps(fields, default=str)}"
+
+
+def start_listener():
+    """
+    Start writing queued records from a fresh queue and listener thread
+    """
+
+    # pylint: disable=global-statement
+    global _listener
+
+    if _queue_handler is None:
+        return
+
+    records: queue.SimpleQueue = queue.SimpleQueue()
+
+    output: logging.StreamHandler = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if LOG_FORMAT == "json" else TextFormatter())
+
+    # A forked child inherits the queue but not the listener thread
+    _queue_handler.queue = records
+    _listener = QueueListener(records, output)
+    _listener.start()
+
+
+def stop_logging():
+    """
+    Write out any queued records and stop the listener thread
+    """
+
+    # pylint: disable=global-statement
+    global _listener
+
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging():
+    """
+    Route this package's logs through the queue, once per process
+    """
+
+    # pylint: disable=global-statement
+    global _queue_handler
+
+    if _queue_handler is not None:
+        return
+
+    _queue_handler = QueueHandler(queue.SimpleQueue())
+    _queue_handler.addFilter(RequestIdFilter())
+
+    logger: logging.Logger = logging.getLogger("app")
+    logger.setLevel(LOG_LEVEL)
+    logger.addHandler(_queue_handler)
+    logger.propagate = False
+
+    start_listener()
+
+    atexit.register(stop_logging)
+    os.register_at_fork(after_in_child=start_listener)
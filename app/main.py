@@ -2,9 +2,24 @@
 Bootstraps the API
 """
 
-from fastapi import FastAPI
+import uuid
+from typing import Dict
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from .routers import root, mint
+from .logs import configure_logging, request_id
+from .mint.attribute_index import start_attribute_index
+from .mint.http_client import close_http_client
+from .mint.prerender import start_prerender_warmer, stop_prerender_warmer
+from .mint.render_pool import shutdown_render_pool
+from .mint.retention import start_archive_sweeper
+from .routers import root, mint, preview
+from .startup import log_worker_ready, warm_up
+from .timing import SERVER_TIMING, format_server_timing, stage_timings
+
+configure_logging()
+
+# Runs in the gunicorn master, before forking, when preloading
+warm_up()
 
 app = FastAPI()
 
@@ -26,5 +41,80 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def add_server_timing(request: Request, call_next):
+    """
+    Report the request's stage timings in a Server-Timing header
+    """
+
+    if SERVER_TIMING is False:
+        return await call_next(request)
+
+    timings: Dict[str, float] = {}
+    token = stage_timings.set(timings)
+
+    try:
+        response = await call_next(request)
+    finally:
+        stage_timings.reset(token)
+
+    if len(timings) > 0:
+        response.headers["Server-Timing"] = format_server_timing(timings)
+
+    return response
+
+
+@app.middleware("http")
+async def add_request_id(request: Request, call_next):
+    """
+    Tag the request's logs with a correlation ID, echoed in X-Request-ID
+    """
+
+    correlation_id: str = request.headers.get("x-request-id", "")[:128]
+
+    if correlation_id == "":
+        correlation_id = uuid.uuid4().hex
+
+    token = request_id.set(correlation_id)
+
+    try:
+        response = await call_next(request)
+    finally:
+        request_id.reset(token)
+
+    response.headers["X-Request-ID"] = correlation_id
+
+    return response
+
+
 app.include_router(root.router)
 app.include_router(mint.router)
+app.include_router(preview.router)
+
+
+@app.on_event("startup")
+async def startup():
+    """
+    Start background workers
+    """
+
+    start_attribute_index()
+
+    start_archive_sweeper()
+
+    start_prerender_warmer()
+
+    log_worker_ready()
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    """
+    Stop background workers and release pooled connections
+    """
+
+    stop_prerender_warmer()
+
+    await close_http_client()
+
+    shutdown_render_pool()
@@ -0,0 +1,113 @@
+"""
+Prometheus metrics for the mint pipeline
+
+Set PROMETHEUS_MULTIPROC_DIR to an empty, writable folder to aggregate
+metrics across gunicorn workers.
+"""
+
+import os
+from contextlib import contextmanager
+from typing import Iterator, Optional, Tuple
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    REGISTRY,
+    CollectorRegistry,
+    Counter,
+    Gauge,
+    Histogram,
+    generate_latest,
+    multiprocess,
+)
+
+# Minting waits on pinning services, so the buckets reach minutes
+STAGE_BUCKETS: Tuple[float, ...] = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    120.0,
+)
+
+stage_seconds = Histogram(
+    "mint_stage_seconds",
+    "Time spent in each stage of the mint pipeline",
+    ["stage"],
+    buckets=STAGE_BUCKETS,
+)
+
+stage_errors = Counter(
+    "mint_stage_errors_total",
+    "Stages that raised, by exception type",
+    ["stage", "error"],
+)
+
+cache_lookups = Counter(
+    "mint_cache_lookups_total",
+    "Cache lookups by cache and result",
+    ["cache", "result"],
+)
+
+in_flight = Gauge(
+    "mint_in_flight",
+    "Operations currently running",
+    ["operation"],
+    multiprocess_mode="livesum",
+)
+
+
+def observe_stage(name: str, seconds: float, error: Optional[BaseException]):
+    """
+    Record how long a stage took and whether it raised
+    """
+
+    stage_seconds.labels(name).observe(seconds)
+
+    # Cancellation is not a failure of the stage
+    if isinstance(error, Exception):
+        stage_errors.labels(name, type(error).__name__).inc()
+
+
+def count_cache_lookup(cache: str, hit: bool):
+    """
+    Count a cache hit or miss
+    """
+
+    cache_lookups.labels(cache, "hit" if hit else "miss").inc()
+
+
+@contextmanager
+def track_in_flight(operation: str) -> Iterator[None]:
+    """
+    Count an operation as in flight for the duration of a block
+    """
+
+    gauge = in_flight.labels(operation)
+    gauge.inc()
+
+    try:
+        yield
+    finally:
+        gauge.dec()
+
+
+def render_metrics() -> Tuple[bytes, str]:
+    """
+    Render every metric in the Prometheus text format, with its content type
+    """
+
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+    registry: CollectorRegistry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+
+    return generate_latest(registry), CONTENT_TYPE_LATEST
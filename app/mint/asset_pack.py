@@ -0,0 +1,113 @@
+"""
+Compile every catalog layer into a single memory-mappable asset pack
+"""
+
+import json
+import logging
+import os
+from typing import Dict, List, TypedDict
+from .config import ASSET_PACK_PATH
+from .layer_images import (
+    ASSET_PACK_HEADER,
+    ASSET_PACK_MAGIC,
+    ASSET_PACK_VERSION,
+    LayerImage,
+    LayerSource,
+    PackedLayer,
+    get_asset_pack_key,
+    get_catalog_layer_sources,
+    read_layer_image,
+)
+
+logger = logging.getLogger(__name__)
+
+# Pixel blocks start on cache line boundaries
+BLOCK_ALIGNMENT: int = 64
+
+
+class AssetPackResult(TypedDict):
+    layers: int
+    pixel_bytes: int
+    pack_bytes: int
+
+
+def build_asset_pack() -> AssetPackResult:
+    """
+    Write the cropped RGBA pixels of every catalog layer and the index
+    describing them
+
+    The pack is replaced atomically. Running workers keep the pack they
+    mapped until they notice the new file.
+    """
+
+    if ASSET_PACK_PATH == "":
+        raise Exception("ASSET_PACK_PATH is not set")
+
+    index: Dict[str, PackedLayer] = {}
+
+    result: AssetPackResult = {"layers": 0, "pixel_bytes": 0, "pack_bytes": 0}
+
+    sources: List[LayerSource] = get_catalog_layer_sources()
+
+    temporary_path: str = f"{ASSET_PACK_PATH}.tmp"
+
+    os.makedirs(os.path.dirname(ASSET_PACK_PATH) or ".", exist_ok=True)
+
+    with open(temporary_path, "wb") as outfile:
+        # The header is written last, once the index position is known
+        outfile.write(bytes(ASSET_PACK_HEADER.size))
+
+        for source in sources:
+            layer_name, option_id, path = source
+
+            try:
+                mtime: int = os.stat(path).st_mtime_ns
+                layer_image: LayerImage = read_layer_image(source, mtime)
+            except OSError as error:
+                logger.warning("Failed to pack layer: %s %s", path, error)
+                continue
+
+            entry: PackedLayer = {
+                "path": path,
+                "mtime": mtime,
+                "offset": layer_image.offset,
+                "size": layer_image.size,
+                "crop": None,
+                "start": 0,
+            }
+
+            if layer_image.image is not None:
+                outfile.write(bytes(-outfile.tell() % BLOCK_ALIGNMENT))
+
+                pixels: bytes = layer_image.image.tobytes("raw", "RGBA")
+
+                entry["crop"] = layer_image.image.size
+                entry["start"] = outfile.tell()
+
+                outfile.write(pixels)
+
+                result["pixel_bytes"] += len(pixels)
+
+            index[get_asset_pack_key(layer_name, option_id)] = entry
+            result["layers"] += 1
+
+        index_bytes: bytes = json.dumps(index).encode("utf-8")
+        index_start: int = outfile.tell()
+
+        outfile.write(index_bytes)
+
+        result["pack_bytes"] = outfile.tell()
+
+        outfile.seek(0)
+        outfile.write(
+            ASSET_PACK_HEADER.pack(
+                ASSET_PACK_MAGIC,
+                ASSET_PACK_VERSION,
+                index_start,
+                len(index_bytes),
+            )
+        )
+
+    os.replace(temporary_path, ASSET_PACK_PATH)
+
+    return result
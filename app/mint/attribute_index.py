@@ -0,0 +1,168 @@
+"""
+Locally synced index of attribute combinations already minted
+"""
+
+import logging
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Set
+from ..metrics import count_cache_lookup
+from ..timing import time_stage
+from ..web3_providers import get_contract, get_http_web3, to_checksum_address
+from .abi import MINT_CONTRACT_ABI
+from .config import (
+    MINT_CONTRACT_ADDRESS,
+    MINT_INDEX_BLOCK_RANGE,
+    MINT_INDEX_ENABLED,
+    MINT_INDEX_EVENT,
+    MINT_INDEX_MAX_LAG,
+    MINT_INDEX_POLL_INTERVAL,
+    MINT_INDEX_START_BLOCK,
+    MINT_INDEX_TOPIC,
+    MINT_RPC_URL,
+)
+
+if TYPE_CHECKING:
+    from web3 import Web3
+
+logger = logging.getLogger(__name__)
+
+
+class AttributeIndex:
+    """
+    Set of used attribute values, followed from the mint contract's events
+
+    The attribute is read from an indexed topic of MINT_INDEX_EVENT.
+    """
+
+    def __init__(self):
+        self.attributes: Set[int] = set()
+        self.synced_block: int = MINT_INDEX_START_BLOCK - 1
+        self.head_block: Optional[int] = None
+        self.polled_at: float = 0.0
+        self.thread: Optional[threading.Thread] = None
+
+    def is_current(self) -> bool:
+        """
+        Check if the index is close enough to the chain head to be trusted
+        """
+
+        if self.head_block is None:
+            return False
+
+        # A stalled poller means the head we last saw is out of date too
+        if time.monotonic() - self.polled_at > MINT_INDEX_POLL_INTERVAL * 3:
+            return False
+
+        return self.head_block - self.synced_block <= MINT_INDEX_MAX_LAG
+
+    def sync(self):
+        """
+        Add the events of every block up to the current head
+        """
+
+        # pylint: disable=import-outside-toplevel
+        from web3 import Web3
+
+        web3: "Web3" = get_http_web3(MINT_RPC_URL)
+
+        head_block: int = web3.eth.block_number
+        topic: str = Web3.keccak(text=MINT_INDEX_EVENT).hex()
+
+        while self.synced_block < head_block:
+            from_block: int = self.synced_block + 1
+            to_block: int = min(head_block, from_block + MINT_INDEX_BLOCK_RANGE - 1)
+
+            logs: List[Dict[str, Any]] = web3.eth.get_logs(
+                {
+                    "address": to_checksum_address(MINT_CONTRACT_ADDRESS),
+                    "fromBlock": from_block,
+                    "toBlock": to_block,
+                    "topics": [topic],
+                }
+            )
+
+            for log in logs:
+                if len(log["topics"]) > MINT_INDEX_TOPIC:
+                    self.attributes.add(
+                        int.from_bytes(bytes(log["topics"][MINT_INDEX_TOPIC]), "big")
+                    )
+
+            self.synced_block = to_block
+            self.head_block = head_block
+            self.polled_at = time.monotonic()
+
+        self.head_block = head_block
+        self.polled_at = time.monotonic()
+
+    def run(self):
+        """
+        Backfill, then poll for new blocks forever
+        """
+
+        while True:
+            try:
+                self.sync()
+            except Exception as error:
+                logger.warning("Failed to sync attribute index: %s", error)
+
+            time.sleep(MINT_INDEX_POLL_INTERVAL)
+
+    def start(self):
+        """
+        Start syncing in a background thread
+        """
+
+        if self.thread is None:
+            self.thread = threading.Thread(
+                target=self.run,
+                name="attribute-index",
+                daemon=True,
+            )
+            self.thread.start()
+
+
+attribute_index: AttributeIndex = AttributeIndex()
+
+
+def start_attribute_index():
+    """
+    Start the background attribute indexer, if enabled
+    """
+
+    if MINT_INDEX_ENABLED is True:
+        attribute_index.start()
+
+
+def is_attribute_in_use(traits_hex: str) -> bool:
+    """
+    Check if an attribute combination has already been minted
+
+    Uses the local index while it is current, otherwise asks the contract.
+    """
+
+    if MINT_INDEX_ENABLED is True:
+        # Minted combinations never become available again
+        if int(traits_hex, 16) in attribute_index.attributes:
+            count_cache_lookup("attribute_index", True)
+            return True
+
+        if attribute_index.is_current() is True:
+            count_cache_lookup("attribute_index", True)
+            return False
+
+        count_cache_lookup("attribute_index", False)
+
+    contract = get_contract(
+        "http",
+        MINT_RPC_URL,
+        MINT_CONTRACT_ADDRESS,
+        MINT_CONTRACT_ABI,
+    )
+
+    with time_stage("rpc_token_attribute_exists"):
+        attribute_already_in_use: bool = contract.functions.tokenAttributeExists(
+            traits_hex,
+        ).call()
+
+    return attribute_already_in_use is True
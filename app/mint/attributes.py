@@ -2,14 +2,12 @@
 Handle Determining NFT Metadata Traits and Attributes Based on Input Traits
 """
 
-import json
-from .config import MINT_RESOURCE_PATH
+from .catalog import LayerCatalog, get_catalog
 from .typings import (
     Attributes,
     InputTraits,
     Layer,
     LayerOption,
-    LayerOptions,
     Layers,
     Trait,
     Traits,
@@ -21,15 +19,15 @@ def input_traits_to_traits(input_traits: InputTraits) -> Traits:
     Convert API input traits into real traits based on traits config
     """
 
-    all_layers: Layers = get_all_layers()
+    catalog: LayerCatalog = get_catalog()
 
     traits: Traits = []
 
     for trait_type, value in input_traits.items():
-        layer: Layer = get_layer_by_name(all_layers, trait_type)
+        layer: Layer = catalog.get_layer(trait_type)
 
-        layer_option: LayerOption = get_layer_option_by_name(
-            layer["options"],
+        layer_option: LayerOption = catalog.get_layer_option(
+            layer["name"],
             value,
         )
 
@@ -80,8 +78,6 @@ def traits_to_hex(traits: Traits) -> str:
         [id_to_hex(trait["option"]["id"]) for trait in res_traits]
     ).rjust(64, "0")
 
-    print(hex_str)
-
     return hex_str
 
 
@@ -98,41 +94,7 @@ def get_all_layers() -> Layers:
     Get all layers data from layers config json
     """
 
-    layers_json_path: str = f"{MINT_RESOURCE_PATH}/config/layers.json"
-
-    all_layers = json.load(open(layers_json_path, "r", encoding="utf-8"))
-
-    return all_layers
-
-
-def get_layer_by_name(layers: Layers, name: str) -> Layer:
-    """
-    Get a layer, from a set, by it's name
-    """
-
-    filtered_layers: Layers = [
-        layer for layer in layers if layer["name"].lower() == name.lower()
-    ]
-
-    if len(filtered_layers) == 0:
-        raise Exception(f"trait does not exist: {name}")
-
-    return filtered_layers[0]
-
-
-def get_layer_option_by_name(options: LayerOptions, name: str) -> LayerOption:
-    """
-    Get a layer option, from a set, by it's name
-    """
-
-    filtered_options: LayerOptions = [
-        option for option in options if option["name"].lower() == name.lower()
-    ]
-
-    if len(filtered_options) == 0:
-        raise Exception(f"trait option does not exist: {name}")
-
-    return filtered_options[0]
+    return get_catalog().layers
 
 
 def sort_traits(traits: Traits):
@@ -0,0 +1,191 @@
+"""
+Compiled, in-memory index of the layers config
+"""
+
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Optional, Tuple
+from .config import MINT_RESOURCE_PATH
+from .typings import Layer, LayerOption, Layers, Trait
+
+logger = logging.getLogger(__name__)
+
+LAYERS_JSON_PATH: str = f"{MINT_RESOURCE_PATH}/config/layers.json"
+
+LAYERS_INPUT_PATH: str = f"{MINT_RESOURCE_PATH}/input"
+
+LAYERS_THUMBS_PATH: str = f"{MINT_RESOURCE_PATH}/thumbs"
+
+
+class LayerCatalog:
+    """
+    Layers config compiled into lower-cased lookup indexes and asset paths
+    """
+
+    def __init__(self, layers: Layers, digest: str, stamp: Tuple[int, int]):
+        self.layers: Layers = layers
+        self.digest: str = digest
+        self.stamp: Tuple[int, int] = stamp
+        self.base_image_path: str = f"{LAYERS_INPUT_PATH}/base.png"
+
+        self.layers_by_name: Dict[str, Layer] = {}
+        self.options_by_name: Dict[Tuple[str, str], LayerOption] = {}
+        self.image_paths: Dict[Tuple[str, int], str] = {}
+
+        for layer in layers:
+            layer_key: str = layer["name"].lower()
+
+            # The first layer with a given name wins, as with a list scan
+            if layer_key in self.layers_by_name:
+                continue
+
+            self.layers_by_name[layer_key] = layer
+
+            for option in layer["options"]:
+                self.options_by_name.setdefault(
+                    (layer_key, option["name"].lower()),
+                    option,
+                )
+
+                self.image_paths[(layer_key, option["id"])] = get_image_path(
+                    layer["name"],
+                    option,
+                )
+
+    def get_layer(self, name: str) -> Layer:
+        """
+        Get a layer by it's name
+        """
+
+        layer: Optional[Layer] = self.layers_by_name.get(name.lower())
+
+        if layer is None:
+            raise Exception(f"trait does not exist: {name}")
+
+        return layer
+
+    def get_layer_option(self, layer_name: str, name: str) -> LayerOption:
+        """
+        Get a layer option by it's layer name and option name
+        """
+
+        layer_option: Optional[LayerOption] = self.options_by_name.get(
+            (layer_name.lower(), name.lower())
+        )
+
+        if layer_option is None:
+            raise Exception(f"trait option does not exist: {name}")
+
+        return layer_option
+
+    def get_trait_image_path(self, trait: Trait) -> str:
+        """
+        Get the layer image path for a trait
+        """
+
+        image_path: Optional[str] = self.image_paths.get(
+            (trait["name"].lower(), trait["option"]["id"])
+        )
+
+        if image_path is None:
+            image_path = get_image_path(trait["name"], trait["option"])
+
+        return image_path
+
+
+def get_image_path(layer_name: str, option: LayerOption) -> str:
+    """
+    Get the input image path of a layer option
+    """
+
+    # pylint: disable=consider-using-f-string
+    return "{}/{}/{}-{}.{}".format(
+        LAYERS_INPUT_PATH,
+        layer_name.lower(),
+        str(option["id"]).lower().rjust(3, "0"),
+        option["name"].lower(),
+        option["ext"].lower(),
+    )
+    # pylint: enable=consider-using-f-string
+
+
+def get_thumb_path(layer_name: str, option: LayerOption) -> str:
+    """
+    Get the reduced resolution image path of a layer option
+    """
+
+    # pylint: disable=consider-using-f-string
+    return "{}/{}/{}-{}.{}".format(
+        LAYERS_THUMBS_PATH,
+        layer_name.lower(),
+        str(option["id"]).lower().rjust(3, "0"),
+        option["name"].lower(),
+        option["thumbExt"].lower(),
+    )
+    # pylint: enable=consider-using-f-string
+
+
+_catalog: Optional[LayerCatalog] = None
+
+_catalog_lock = threading.Lock()
+
+
+def get_catalog() -> LayerCatalog:
+    """
+    Get the compiled layer catalog, recompiling it if the config has changed
+    """
+
+    stat: os.stat_result = os.stat(LAYERS_JSON_PATH)
+    stamp: Tuple[int, int] = (stat.st_mtime_ns, stat.st_size)
+
+    catalog: Optional[LayerCatalog] = _catalog
+
+    if catalog is not None and catalog.stamp == stamp:
+        return catalog
+
+    with _catalog_lock:
+        return _reload_catalog(stamp)
+
+
+def _reload_catalog(stamp: Tuple[int, int]) -> LayerCatalog:
+    """
+    Recompile the layer catalog if the config content has changed
+    """
+
+    # pylint: disable=global-statement
+    global _catalog
+
+    catalog: Optional[LayerCatalog] = _catalog
+
+    # Another thread may have reloaded while we waited for the lock
+    if catalog is not None and catalog.stamp == stamp:
+        return catalog
+
+    with open(LAYERS_JSON_PATH, "rb") as infile:
+        content: bytes = infile.read()
+
+    digest: str = hashlib.sha256(content).hexdigest()
+
+    # Touched but unchanged, so keep the compiled indexes
+    if catalog is not None and catalog.digest == digest:
+        catalog.stamp = stamp
+        return catalog
+
+    try:
+        layers: Layers = json.loads(content)
+        new_catalog: LayerCatalog = LayerCatalog(layers, digest, stamp)
+    except Exception as error:
+        # Keep serving the last good catalog if the config is mid-write
+        if catalog is not None:
+            logger.error("Failed to reload layers config: %s", error)
+            return catalog
+
+        raise
+
+    # Swap in the fully compiled catalog in a single assignment
+    _catalog = new_catalog
+
+    return new_catalog
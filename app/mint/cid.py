@@ -0,0 +1,150 @@
+"""
+Compute IPFS CIDv1s locally, matching what the pinning services return
+"""
+
+import base64
+import hashlib
+from typing import List, Tuple
+
+CODEC_RAW: int = 0x55
+
+CODEC_DAG_PB: int = 0x70
+
+MULTIHASH_SHA2_256: int = 0x12
+
+UNIXFS_TYPE_FILE: int = 2
+
+# (cid bytes, cumulative dag size, file bytes)
+DagNode = Tuple[bytes, int, int]
+
+
+def encode_varint(value: int) -> bytes:
+    """
+    Encode an unsigned integer as a protobuf / multiformats varint
+    """
+
+    encoded: bytearray = bytearray()
+
+    while value > 0x7F:
+        encoded.append((value & 0x7F) | 0x80)
+        value >>= 7
+
+    encoded.append(value)
+
+    return bytes(encoded)
+
+
+def encode_protobuf_field(field_number: int, wire_type: int) -> bytes:
+    """
+    Encode a protobuf field key
+    """
+
+    return encode_varint((field_number << 3) | wire_type)
+
+
+def encode_protobuf_bytes(field_number: int, value: bytes) -> bytes:
+    """
+    Encode a length delimited protobuf field
+    """
+
+    return encode_protobuf_field(field_number, 2) + encode_varint(len(value)) + value
+
+
+def encode_protobuf_varint(field_number: int, value: int) -> bytes:
+    """
+    Encode a varint protobuf field
+    """
+
+    return encode_protobuf_field(field_number, 0) + encode_varint(value)
+
+
+def get_cid_bytes(codec: int, data: bytes) -> bytes:
+    """
+    Get the binary CIDv1 of a block
+    """
+
+    digest: bytes = hashlib.sha256(data).digest()
+
+    return (
+        encode_varint(1)
+        + encode_varint(codec)
+        + encode_varint(MULTIHASH_SHA2_256)
+        + encode_varint(len(digest))
+        + digest
+    )
+
+
+def cid_bytes_to_str(cid: bytes) -> str:
+    """
+    Encode a binary CID as base32 multibase, as the pinning services do
+    """
+
+    return "b" + base64.b32encode(cid).decode("utf-8").lower().rstrip("=")
+
+
+def encode_file_node(children: List[DagNode]) -> bytes:
+    """
+    Encode a dag-pb UnixFS file node linking to its children
+    """
+
+    unixfs_data: bytes = encode_protobuf_varint(1, UNIXFS_TYPE_FILE)
+    unixfs_data += encode_protobuf_varint(
+        3,
+        sum(file_size for _, _, file_size in children),
+    )
+
+    for _, _, file_size in children:
+        unixfs_data += encode_protobuf_varint(4, file_size)
+
+    # dag-pb canonical form puts links before data
+    node: bytes = b""
+
+    for cid, dag_size, _ in children:
+        link: bytes = encode_protobuf_bytes(1, cid)
+        link += encode_protobuf_bytes(2, b"")
+        link += encode_protobuf_varint(3, dag_size)
+
+        node += encode_protobuf_bytes(2, link)
+
+    node += encode_protobuf_bytes(1, unixfs_data)
+
+    return node
+
+
+def get_ipfs_cid(data: bytes, chunk_size: int, max_links: int) -> str:
+    """
+    Get the CIDv1 of a file added with raw leaves and a balanced layout
+
+    Files that fit in a single chunk are a lone raw block. Larger files are
+    chunked into raw leaves joined by dag-pb UnixFS nodes.
+    """
+
+    if len(data) <= chunk_size:
+        return cid_bytes_to_str(get_cid_bytes(CODEC_RAW, data))
+
+    nodes: List[DagNode] = []
+
+    for offset in range(0, len(data), chunk_size):
+        chunk: bytes = data[offset : offset + chunk_size]
+        nodes.append((get_cid_bytes(CODEC_RAW, chunk), len(chunk), len(chunk)))
+
+    # Pack nodes into parents left to right until a single root remains
+    while True:
+        parents: List[DagNode] = []
+
+        for offset in range(0, len(nodes), max_links):
+            children: List[DagNode] = nodes[offset : offset + max_links]
+            node: bytes = encode_file_node(children)
+
+            parents.append(
+                (
+                    get_cid_bytes(CODEC_DAG_PB, node),
+                    len(node) + sum(dag_size for _, dag_size, _ in children),
+                    sum(file_size for _, _, file_size in children),
+                )
+            )
+
+        nodes = parents
+
+        if len(nodes) == 1:
+            return cid_bytes_to_str(nodes[0][0])
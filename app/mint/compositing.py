@@ -0,0 +1,236 @@
+"""
+Handle compositing layer images into a single NFT image
+"""
+
+import logging
+from typing import Callable, Dict, List, Optional, Tuple
+import numpy as np
+from PIL import Image
+from .config import COMPOSITING_ENGINE
+from .encoding import encode_png
+from .layer_images import (
+    LayerImage,
+    LayerSource,
+    get_base_image,
+    get_base_layer_source,
+    get_catalog_layer_sources,
+    get_layer_image,
+    get_layer_key,
+    get_trait_image,
+    get_trait_layer_source,
+    layer_image_cache,
+)
+from .typings import Traits
+
+logger = logging.getLogger(__name__)
+
+# (traits already composited, raw RGB pixels of the canvas after them)
+PartialStack = Tuple[int, bytes]
+
+# (top, left, bottom, right) of the non-transparent pixels of a layer
+BoundingBox = Tuple[int, int, int, int]
+
+
+class PreparedLayer:
+    """
+    Layer pixels premultiplied by alpha, cropped to their bounding box
+    """
+
+    def __init__(self, layer_image: LayerImage):
+        self.size: Tuple[int, int] = layer_image.size
+
+        if layer_image.image is None:
+            self.bbox: Optional[BoundingBox] = None
+            self.premultiplied: np.ndarray = np.zeros((0, 0, 3), np.uint16)
+            self.inverse_alpha: np.ndarray = np.zeros((0, 0, 1), np.uint16)
+            return
+
+        left, top = layer_image.offset
+
+        pixels: np.ndarray = np.asarray(layer_image.image, dtype=np.uint16)
+        alpha: np.ndarray = pixels[:, :, 3:4]
+
+        self.bbox = (top, left, top + pixels.shape[0], left + pixels.shape[1])
+        self.premultiplied = pixels[:, :, :3] * alpha
+        self.inverse_alpha = 255 - alpha
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory used by the prepared pixels
+        """
+
+        return int(self.premultiplied.nbytes + self.inverse_alpha.nbytes)
+
+
+def composite_traits(
+    traits: Traits,
+    stack: Optional[PartialStack] = None,
+) -> Image.Image:
+    """
+    Composite the blank first layer and each trait's layer into an RGB image,
+    continuing from a partial stack of the first traits if given
+    """
+
+    engine: Optional[CompositingEngine] = COMPOSITING_ENGINES.get(COMPOSITING_ENGINE)
+
+    if engine is None:
+        raise Exception(f"Unknown compositing engine: {COMPOSITING_ENGINE}")
+
+    return engine(traits, stack)
+
+
+def render_image(traits: Traits, stack: Optional[PartialStack] = None) -> bytes:
+    """
+    Composite a trait combination and encode it as PNG
+    """
+
+    composite_image: Image.Image = composite_traits(traits, stack)
+
+    return encode_png(composite_image)
+
+
+def composite_traits_with_pillow(
+    traits: Traits,
+    stack: Optional[PartialStack] = None,
+) -> Image.Image:
+    """
+    Composite layers by sequentially pasting their cropped regions with Pillow
+    """
+
+    # Get the blank first layer. This is used for sizing.
+    layer_image: LayerImage = get_base_image()
+
+    if stack is None:
+        # Start the new composite image with the blank layer
+        composite_image = Image.new("RGB", layer_image.size)
+        paste_layer(composite_image, layer_image)
+        depth: int = 0
+    else:
+        depth, pixels = stack
+        composite_image = Image.frombytes("RGB", layer_image.size, pixels)
+
+    # Add each remaining attribute's layer
+    for trait in traits[depth:]:
+        paste_layer(composite_image, get_trait_image(trait))
+
+    return composite_image
+
+
+def paste_layer(composite_image: Image.Image, layer_image: LayerImage):
+    """
+    Paste the visible region of a layer at its offset
+    """
+
+    if layer_image.image is None:
+        return
+
+    composite_image.paste(layer_image.image, layer_image.offset, layer_image.image)
+
+
+def composite_traits_with_numpy(
+    traits: Traits,
+    stack: Optional[PartialStack] = None,
+) -> Image.Image:
+    """
+    Composite layers as premultiplied NumPy arrays
+
+    Each layer is blended inside its bounding box using the same integer
+    rounding as Pillow's paste, so the output is byte identical.
+    """
+
+    # Get the blank first layer. This is used for sizing.
+    base_layer: PreparedLayer = get_prepared_layer(get_base_layer_source())
+
+    width, height = base_layer.size
+
+    if stack is None:
+        canvas: np.ndarray = np.zeros((height, width, 3), np.uint16)
+        blend_layer(canvas, base_layer)
+        depth: int = 0
+    else:
+        depth, pixels = stack
+        canvas = (
+            np.frombuffer(pixels, np.uint8)
+            .reshape((height, width, 3))
+            .astype(np.uint16)
+        )
+
+    for trait in traits[depth:]:
+        blend_layer(canvas, get_prepared_layer(get_trait_layer_source(trait)))
+
+    return Image.fromarray(canvas.astype(np.uint8), "RGB")
+
+
+def blend_layer(canvas: np.ndarray, layer: PreparedLayer):
+    """
+    Blend a prepared layer into a uint16 RGB canvas in place
+    """
+
+    if layer.bbox is None:
+        return
+
+    top, left, bottom, right = layer.bbox
+
+    # Clip layers larger than the canvas, as paste does
+    bottom = min(bottom, canvas.shape[0])
+    right = min(right, canvas.shape[1])
+
+    if top >= bottom or left >= right:
+        return
+
+    region: np.ndarray = canvas[top:bottom, left:right]
+    height: int = bottom - top
+    width: int = right - left
+
+    # out * (255 - a) + in * a is at most 255 * 255, so this fits in uint16
+    blended: np.ndarray = region * layer.inverse_alpha[:height, :width]
+    blended += layer.premultiplied[:height, :width]
+    blended += 128
+
+    # Pillow's DIV255 rounding: ((v + 128) >> 8 + (v + 128)) >> 8
+    blended += blended >> 8
+    blended >>= 8
+
+    region[...] = blended
+
+
+def get_prepared_layer(source: LayerSource) -> PreparedLayer:
+    """
+    Get the prepared NumPy form of a layer, cached alongside decoded images
+    """
+
+    key: Tuple[str, str, int, int] = ("prepared",) + get_layer_key(source)
+
+    layer: Optional[PreparedLayer] = layer_image_cache.get(key)
+
+    if layer is None:
+        layer = PreparedLayer(get_layer_image(source))
+        layer_image_cache.set(key, layer, layer.nbytes)
+
+    return layer
+
+
+def preload_layers():
+    """
+    Decode and prepare every catalog layer ahead of the first render
+    """
+
+    sources: List[LayerSource] = get_catalog_layer_sources()
+
+    for source in sources:
+        try:
+            if COMPOSITING_ENGINE == "numpy":
+                get_prepared_layer(source)
+            else:
+                get_layer_image(source)
+        except OSError as error:
+            logger.warning("Failed to preload layer: %s %s", source[2], error)
+
+
+CompositingEngine = Callable[[Traits, Optional[PartialStack]], Image.Image]
+
+COMPOSITING_ENGINES: Dict[str, CompositingEngine] = {
+    "pillow": composite_traits_with_pillow,
+    "numpy": composite_traits_with_numpy,
+}
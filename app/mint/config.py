@@ -15,3 +15,113 @@ MINT_RPC_URL = os.environ["MINT_RPC_URL"]
 MINT_CONTRACT_ADDRESS = os.environ["MINT_CONTRACT_ADDRESS"]
 
 MINT_SIGNER_PRIVATE_KEY = os.environ["MINT_SIGNER_PRIVATE_KEY"]
+
+LAYER_CACHE_MAX_BYTES = int(os.environ.get("LAYER_CACHE_MAX_BYTES", "268435456"))
+
+ASSET_PACK_PATH = os.environ.get("ASSET_PACK_PATH", f"{MINT_RESOURCE_PATH}/layers.pack")
+
+COMPOSITING_ENGINE = os.environ.get("COMPOSITING_ENGINE", "pillow")
+
+PUBLISH_CACHE_PATH = os.environ.get(
+    "PUBLISH_CACHE_PATH",
+    f"{MINT_RESOURCE_PATH}/publish_cache.sqlite3",
+)
+
+PUBLISH_COALESCE = os.environ.get("PUBLISH_COALESCE", "true").lower() == "true"
+
+PUBLISH_LOCK_TIMEOUT = float(os.environ.get("PUBLISH_LOCK_TIMEOUT", "150"))
+
+PUBLISH_LOCK_POLL_INTERVAL = float(os.environ.get("PUBLISH_LOCK_POLL_INTERVAL", "0.05"))
+
+IPFS_LOCAL_CID = os.environ.get("IPFS_LOCAL_CID", "true").lower() == "true"
+
+IPFS_CID_VERIFY = os.environ.get("IPFS_CID_VERIFY", "true").lower() == "true"
+
+IPFS_PIN_PRECHECK = os.environ.get("IPFS_PIN_PRECHECK", "false").lower() == "true"
+
+IPFS_CHUNK_SIZE = int(os.environ.get("IPFS_CHUNK_SIZE", "262144"))
+
+IPFS_MAX_LINKS = int(os.environ.get("IPFS_MAX_LINKS", "174"))
+
+PIN_CONNECT_TIMEOUT = float(os.environ.get("PIN_CONNECT_TIMEOUT", "10"))
+
+PIN_READ_TIMEOUT = float(os.environ.get("PIN_READ_TIMEOUT", "120"))
+
+PIN_MAX_CONNECTIONS = int(os.environ.get("PIN_MAX_CONNECTIONS", "20"))
+
+PIN_HTTP2 = os.environ.get("PIN_HTTP2", "true").lower() == "true"
+
+MINT_HASH_SOURCE = os.environ.get("MINT_HASH_SOURCE", "local")
+
+MINT_HASH_ENCODING = os.environ.get("MINT_HASH_ENCODING", "packed")
+
+MINT_HASH_SELF_TEST = os.environ.get("MINT_HASH_SELF_TEST", "true").lower() == "true"
+
+MINT_INDEX_ENABLED = os.environ.get("MINT_INDEX_ENABLED", "false").lower() == "true"
+
+MINT_INDEX_START_BLOCK = int(os.environ.get("MINT_INDEX_START_BLOCK", "0"))
+
+# Which event and indexed topic carry the attribute combination depends on
+# the contract, so there is no default for either
+MINT_INDEX_EVENT = os.environ.get("MINT_INDEX_EVENT", "")
+
+MINT_INDEX_TOPIC = int(os.environ.get("MINT_INDEX_TOPIC") or "0")
+
+if MINT_INDEX_ENABLED is True and (
+    MINT_INDEX_EVENT == "" or MINT_INDEX_TOPIC not in [1, 2, 3]
+):
+    raise Exception(
+        "MINT_INDEX_ENABLED requires MINT_INDEX_EVENT and MINT_INDEX_TOPIC (1 to 3)"
+    )
+
+MINT_INDEX_BLOCK_RANGE = int(os.environ.get("MINT_INDEX_BLOCK_RANGE", "5000"))
+
+MINT_INDEX_POLL_INTERVAL = float(os.environ.get("MINT_INDEX_POLL_INTERVAL", "15"))
+
+MINT_INDEX_MAX_LAG = int(os.environ.get("MINT_INDEX_MAX_LAG", "10"))
+
+RENDER_POOL_SIZE = int(os.environ.get("RENDER_POOL_SIZE", "1"))
+
+RENDER_POOL_MAX_QUEUE = int(os.environ.get("RENDER_POOL_MAX_QUEUE", "32"))
+
+RENDER_POOL_PRELOAD = os.environ.get("RENDER_POOL_PRELOAD", "true").lower() == "true"
+
+PUBLISH_ARCHIVE = os.environ.get("PUBLISH_ARCHIVE", "async")
+
+ARCHIVE_MAX_BYTES = int(os.environ.get("ARCHIVE_MAX_BYTES", "0"))
+
+ARCHIVE_MAX_AGE = float(os.environ.get("ARCHIVE_MAX_AGE", "0"))
+
+ARCHIVE_KEEP_LATEST = int(os.environ.get("ARCHIVE_KEEP_LATEST", "0"))
+
+ARCHIVE_SWEEP_INTERVAL = float(os.environ.get("ARCHIVE_SWEEP_INTERVAL", "3600"))
+
+PNG_PROFILE = os.environ.get("PNG_PROFILE", "balanced")
+
+MINT_BATCH_MAX_ITEMS = int(os.environ.get("MINT_BATCH_MAX_ITEMS", "100"))
+
+MINT_BATCH_CONCURRENCY = int(os.environ.get("MINT_BATCH_CONCURRENCY", "8"))
+
+PRERENDER_ENABLED = os.environ.get("PRERENDER_ENABLED", "true").lower() == "true"
+
+PRERENDER_TOP_K = int(os.environ.get("PRERENDER_TOP_K", "20"))
+
+PRERENDER_MAX_BYTES = int(os.environ.get("PRERENDER_MAX_BYTES", "67108864"))
+
+PRERENDER_MAX_TRACKED = int(os.environ.get("PRERENDER_MAX_TRACKED", "10000"))
+
+PRERENDER_IDLE_SECONDS = float(os.environ.get("PRERENDER_IDLE_SECONDS", "5"))
+
+PRERENDER_INTERVAL = float(os.environ.get("PRERENDER_INTERVAL", "10"))
+
+PREVIEW_SIZES = [
+    int(size) for size in os.environ.get("PREVIEW_SIZES", "256,128,512").split(",")
+]
+
+PREVIEW_CACHE_MAX_BYTES = int(os.environ.get("PREVIEW_CACHE_MAX_BYTES", "33554432"))
+
+PREVIEW_MAX_AGE = int(os.environ.get("PREVIEW_MAX_AGE", "86400"))
+
+PINATA_API_URL = os.environ.get("PINATA_API_URL", "https://api.pinata.cloud")
+
+NFT_STORAGE_API_URL = os.environ.get("NFT_STORAGE_API_URL", "https://api.nft.storage")
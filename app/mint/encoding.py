@@ -0,0 +1,109 @@
+"""
+Named PNG encoding profiles, trading encode CPU for upload bytes
+"""
+
+import io
+from typing import Any, Callable, Dict, Optional
+import numpy as np
+from PIL import Image
+from .config import PNG_PROFILE
+
+
+def encode_png_fast(image: Image.Image) -> bytes:
+    """
+    Encode with the lightest zlib compression
+    """
+
+    return save_png(image, compress_level=1)
+
+
+def encode_png_balanced(image: Image.Image) -> bytes:
+    """
+    Encode with Pillow's default settings
+    """
+
+    return save_png(image, compress_level=6)
+
+
+def encode_png_smallest(image: Image.Image) -> bytes:
+    """
+    Encode with maximum compression and Pillow's encoder optimizations
+    """
+
+    return save_png(image, optimize=True)
+
+
+def encode_png_palette(image: Image.Image) -> bytes:
+    """
+    Encode as an exact 8-bit palette image when there are at most 256 colors
+
+    Images with more colors are encoded with the smallest profile.
+    """
+
+    palette_image: Optional[Image.Image] = to_palette_image(image)
+
+    if palette_image is None:
+        return encode_png_smallest(image)
+
+    return save_png(palette_image, optimize=True)
+
+
+def to_palette_image(image: Image.Image) -> Optional[Image.Image]:
+    """
+    Losslessly convert an RGB image to palette mode, if it has few enough colors
+    """
+
+    if image.mode != "RGB" or image.getcolors(256) is None:
+        return None
+
+    pixels: np.ndarray = np.asarray(image, dtype=np.uint32)
+    packed: np.ndarray = (
+        (pixels[:, :, 0] << 16) | (pixels[:, :, 1] << 8) | pixels[:, :, 2]
+    )
+
+    colors, indexes = np.unique(packed, return_inverse=True)
+
+    palette_image: Image.Image = Image.fromarray(
+        indexes.reshape(packed.shape).astype(np.uint8),
+        "P",
+    )
+
+    palette: np.ndarray = np.stack(
+        [(colors >> 16) & 0xFF, (colors >> 8) & 0xFF, colors & 0xFF],
+        axis=1,
+    )
+    palette_image.putpalette(palette.astype(np.uint8).tobytes())
+
+    return palette_image
+
+
+def save_png(image: Image.Image, **options: Any) -> bytes:
+    """
+    Save an image as PNG bytes
+    """
+
+    output: io.BytesIO = io.BytesIO()
+    image.save(output, "PNG", **options)
+
+    return output.getvalue()
+
+
+PNG_PROFILES: Dict[str, Callable[[Image.Image], bytes]] = {
+    "fast": encode_png_fast,
+    "balanced": encode_png_balanced,
+    "smallest": encode_png_smallest,
+    "palette": encode_png_palette,
+}
+
+
+def encode_png(image: Image.Image, profile: str = PNG_PROFILE) -> bytes:
+    """
+    Encode an image as PNG using a named profile
+    """
+
+    encoder: Optional[Callable[[Image.Image], bytes]] = PNG_PROFILES.get(profile)
+
+    if encoder is None:
+        raise Exception(f"Unknown PNG profile: {profile}")
+
+    return encoder(image)
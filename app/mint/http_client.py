@@ -0,0 +1,51 @@
+"""
+Shared, long lived async HTTP client for the pinning services
+"""
+
+from typing import Optional
+import httpx
+from .config import (
+    PIN_CONNECT_TIMEOUT,
+    PIN_HTTP2,
+    PIN_MAX_CONNECTIONS,
+    PIN_READ_TIMEOUT,
+)
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """
+    Get this worker's pooled keep-alive HTTP client, creating it on first use
+    """
+
+    # pylint: disable=global-statement
+    global _client
+
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            http2=PIN_HTTP2,
+            timeout=httpx.Timeout(
+                PIN_READ_TIMEOUT,
+                connect=PIN_CONNECT_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=PIN_MAX_CONNECTIONS,
+                max_keepalive_connections=PIN_MAX_CONNECTIONS,
+            ),
+        )
+
+    return _client
+
+
+async def close_http_client():
+    """
+    Close this worker's HTTP client and its pooled connections
+    """
+
+    # pylint: disable=global-statement
+    global _client
+
+    if _client is not None:
+        await _client.aclose()
+        _client = None
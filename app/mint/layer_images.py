@@ -0,0 +1,386 @@
+"""
+Per-process cache of decoded, RGBA converted layer images
+"""
+
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+from typing import Any, Dict, List, Optional, Tuple, TypedDict
+from PIL import Image
+from ..cache import LRUCache
+from ..metrics import count_cache_lookup
+from .catalog import LayerCatalog, get_catalog
+from .config import ASSET_PACK_PATH, LAYER_CACHE_MAX_BYTES, MINT_RESOURCE_PATH
+from .typings import Trait
+
+logger = logging.getLogger(__name__)
+
+PREPROCESSED_PATH: str = f"{MINT_RESOURCE_PATH}/preprocessed"
+
+PREPROCESSED_INDEX_PATH: str = f"{PREPROCESSED_PATH}/index.json"
+
+# Magic, version, index start and index length of an asset pack
+ASSET_PACK_HEADER: struct.Struct = struct.Struct("<8sIxxxxQQ")
+
+ASSET_PACK_MAGIC: bytes = b"MINTPACK"
+
+ASSET_PACK_VERSION: int = 1
+
+# (layer name, option id, asset path)
+LayerSource = Tuple[str, int, str]
+
+# (layer name, option id, asset mtime)
+LayerKey = Tuple[str, int, int]
+
+# Shared by decoded images and any representation derived from them
+layer_image_cache: LRUCache[Any] = LRUCache(LAYER_CACHE_MAX_BYTES)
+
+
+class PreprocessedLayer(TypedDict):
+    path: str
+    mtime: int
+    offset: Tuple[int, int]
+    size: Tuple[int, int]
+
+
+class PackedLayer(TypedDict):
+    path: str
+    mtime: int
+    offset: Tuple[int, int]
+    size: Tuple[int, int]
+    crop: Optional[Tuple[int, int]]
+    start: int
+
+
+class LayerImage:
+    """
+    The visible part of a layer as RGBA pixels, and where it sits on the canvas
+
+    Pixels outside the alpha bounding box are fully transparent, and pasting
+    a fully transparent pixel leaves the canvas unchanged, so only the
+    cropped region needs compositing.
+    """
+
+    def __init__(
+        self,
+        image: Optional[Image.Image],
+        offset: Tuple[int, int],
+        size: Tuple[int, int],
+        mapped: bool = False,
+    ):
+        self.image: Optional[Image.Image] = image
+        self.offset: Tuple[int, int] = offset
+        self.size: Tuple[int, int] = size
+        self.mapped: bool = mapped
+
+    @classmethod
+    def from_image(cls, image: Image.Image) -> "LayerImage":
+        """
+        Crop a full canvas RGBA image to its alpha bounding box
+        """
+
+        bbox: Optional[Tuple[int, int, int, int]] = image.getchannel("A").getbbox()
+
+        if bbox is None:
+            return cls(None, (0, 0), image.size)
+
+        return cls(image.crop(bbox), (bbox[0], bbox[1]), image.size)
+
+    @property
+    def nbytes(self) -> int:
+        """
+        Memory used by the decoded pixels, none when they are mapped from
+        the asset pack
+        """
+
+        if self.image is None or self.mapped is True:
+            return 0
+
+        return self.image.width * self.image.height * 4
+
+
+def get_base_layer_source() -> LayerSource:
+    """
+    Get the source of the blank first layer
+    """
+
+    return ("base.png", 0, get_catalog().base_image_path)
+
+
+def get_trait_layer_source(trait: Trait) -> LayerSource:
+    """
+    Get the source of a trait's layer
+    """
+
+    return (
+        trait["name"].lower(),
+        trait["option"]["id"],
+        get_catalog().get_trait_image_path(trait),
+    )
+
+
+def get_catalog_layer_sources() -> List[LayerSource]:
+    """
+    Get the source of the blank first layer and of every catalog option
+    """
+
+    catalog: LayerCatalog = get_catalog()
+
+    sources: List[LayerSource] = [get_base_layer_source()]
+
+    for (layer_name, option_id), path in catalog.image_paths.items():
+        sources.append((layer_name, option_id, path))
+
+    return sources
+
+
+def get_layer_key(source: LayerSource) -> LayerKey:
+    """
+    Get the cache key of a layer source, which changes with the asset's mtime
+    """
+
+    layer_name, option_id, path = source
+
+    return (layer_name, option_id, os.stat(path).st_mtime_ns)
+
+
+def decode_layer_image(source: LayerSource, mtime: int) -> LayerImage:
+    """
+    Map a layer from the asset pack, or decode it when the pack is missing
+    or out of date
+    """
+
+    packed_layer_image: Optional[LayerImage] = get_packed_layer_image(source, mtime)
+
+    if packed_layer_image is not None:
+        return packed_layer_image
+
+    return read_layer_image(source, mtime)
+
+
+def read_layer_image(source: LayerSource, mtime: int) -> LayerImage:
+    """
+    Decode a layer, preferring its preprocessed crop when that is current
+    """
+
+    preprocessed: Optional[PreprocessedLayer] = get_preprocessed_layers().get(source[2])
+
+    if preprocessed is not None and preprocessed["mtime"] == mtime:
+        with Image.open(preprocessed["path"]) as preprocessed_image:
+            return LayerImage(
+                preprocessed_image.convert("RGBA"),
+                tuple(preprocessed["offset"]),
+                tuple(preprocessed["size"]),
+            )
+
+    with Image.open(source[2]) as source_image:
+        return LayerImage.from_image(source_image.convert("RGBA"))
+
+
+def get_layer_image(source: LayerSource) -> LayerImage:
+    """
+    Get a decoded, cropped RGBA layer image
+
+    Cached images are shared between requests and must not be modified.
+    """
+
+    key: LayerKey = get_layer_key(source)
+
+    layer_image: Optional[LayerImage] = layer_image_cache.get(key)
+
+    count_cache_lookup("layer_image", layer_image is not None)
+
+    if layer_image is None:
+        layer_image = decode_layer_image(source, key[2])
+        layer_image_cache.set(key, layer_image, layer_image.nbytes)
+
+    return layer_image
+
+
+def get_base_image() -> LayerImage:
+    """
+    Get the decoded RGBA blank first layer
+    """
+
+    return get_layer_image(get_base_layer_source())
+
+
+def get_trait_image(trait: Trait) -> LayerImage:
+    """
+    Get the decoded RGBA layer image for a trait
+    """
+
+    return get_layer_image(get_trait_layer_source(trait))
+
+
+_preprocessed_layers: Dict[str, PreprocessedLayer] = {}
+
+_preprocessed_stamp: Optional[int] = None
+
+_preprocessed_lock = threading.Lock()
+
+
+def get_preprocessed_layers() -> Dict[str, PreprocessedLayer]:
+    """
+    Get the preprocessed layer index, keyed by source asset path
+    """
+
+    # pylint: disable=global-statement
+    global _preprocessed_layers, _preprocessed_stamp
+
+    try:
+        stamp: Optional[int] = os.stat(PREPROCESSED_INDEX_PATH).st_mtime_ns
+    except OSError:
+        stamp = None
+
+    if stamp == _preprocessed_stamp:
+        return _preprocessed_layers
+
+    with _preprocessed_lock:
+        if stamp is None:
+            _preprocessed_layers = {}
+        else:
+            with open(PREPROCESSED_INDEX_PATH, "r", encoding="utf-8") as infile:
+                _preprocessed_layers = json.load(infile)
+
+        _preprocessed_stamp = stamp
+
+    return _preprocessed_layers
+
+
+class AssetPack:
+    """
+    A memory-mapped asset pack: raw RGBA pixel blocks and an index of them,
+    keyed by layer name and option id
+
+    Every process mapping the pack shares its pages through the page cache.
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as infile:
+            self.buffer: mmap.mmap = mmap.mmap(
+                infile.fileno(),
+                0,
+                access=mmap.ACCESS_READ,
+            )
+
+        magic, version, index_start, index_length = ASSET_PACK_HEADER.unpack_from(
+            self.buffer
+        )
+
+        if magic != ASSET_PACK_MAGIC or version != ASSET_PACK_VERSION:
+            raise ValueError(f"Unsupported asset pack: {path}")
+
+        self.index: Dict[str, PackedLayer] = json.loads(
+            self.buffer[index_start : index_start + index_length]
+        )
+
+    def get_layer_image(self, source: LayerSource, mtime: int) -> Optional[LayerImage]:
+        """
+        Get a layer whose pixels point into the pack, if it is packed and
+        its source is unchanged
+        """
+
+        layer_name, option_id, path = source
+
+        entry: Optional[PackedLayer] = self.index.get(
+            get_asset_pack_key(layer_name, option_id)
+        )
+
+        if entry is None or entry["path"] != path or entry["mtime"] != mtime:
+            return None
+
+        offset: Tuple[int, int] = tuple(entry["offset"])
+        size: Tuple[int, int] = tuple(entry["size"])
+
+        if entry["crop"] is None:
+            return LayerImage(None, offset, size)
+
+        width, height = entry["crop"]
+        start: int = entry["start"]
+
+        # Raw RGBA in a buffer is wrapped without copying, as a read-only image
+        image: Image.Image = Image.frombuffer(
+            "RGBA",
+            (width, height),
+            memoryview(self.buffer)[start : start + width * height * 4],
+            "raw",
+            "RGBA",
+            0,
+            1,
+        )
+
+        return LayerImage(image, offset, size, mapped=True)
+
+
+def get_asset_pack_key(layer_name: str, option_id: int) -> str:
+    """
+    Get the asset pack index key of a layer option
+    """
+
+    return f"{layer_name}/{option_id}"
+
+
+_asset_pack: Optional[AssetPack] = None
+
+_asset_pack_stamp: Optional[Tuple[int, int]] = None
+
+_asset_pack_lock = threading.Lock()
+
+
+def get_asset_pack() -> Optional[AssetPack]:
+    """
+    Get the mapped asset pack, remapping it when the file is replaced
+    """
+
+    # pylint: disable=global-statement
+    global _asset_pack, _asset_pack_stamp
+
+    if ASSET_PACK_PATH == "":
+        return None
+
+    try:
+        stat: os.stat_result = os.stat(ASSET_PACK_PATH)
+        stamp: Optional[Tuple[int, int]] = (stat.st_ino, stat.st_mtime_ns)
+    except OSError:
+        stamp = None
+
+    if stamp == _asset_pack_stamp:
+        return _asset_pack
+
+    with _asset_pack_lock:
+        if stamp != _asset_pack_stamp:
+            # Images of a replaced pack keep its mapping alive until released
+            try:
+                _asset_pack = None if stamp is None else AssetPack(ASSET_PACK_PATH)
+            except (OSError, ValueError) as error:
+                logger.warning("Failed to map asset pack: %s", error)
+                _asset_pack = None
+
+            _asset_pack_stamp = stamp
+
+    return _asset_pack
+
+
+def get_packed_layer_image(source: LayerSource, mtime: int) -> Optional[LayerImage]:
+    """
+    Get a layer mapped from the asset pack, if it is packed and current
+    """
+
+    asset_pack: Optional[AssetPack] = get_asset_pack()
+
+    if asset_pack is None:
+        return None
+
+    return asset_pack.get_layer_image(source, mtime)
+
+
+def get_layer_image_cache_stats() -> Dict[str, int]:
+    """
+    Get the layer image cache counters
+    """
+
+    return layer_image_cache.stats()
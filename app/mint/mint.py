@@ -2,49 +2,95 @@
 Handle generating, pinning and signing an image and metadata for a NFT mint
 """
 
+import asyncio
+import logging
+from typing import Dict, List, Optional, Tuple, Union
+from ..metrics import track_in_flight
+from ..timing import time_stage
+from ..verification.verification import is_verified, validate_address
+from .attribute_index import is_attribute_in_use
 from .attributes import (
     input_traits_to_traits,
     trait_hex_to_decimal,
     traits_to_attributes,
     traits_to_hex,
 )
+from .config import MINT_BATCH_CONCURRENCY
 from .publish import publish
 from .sign import sign
 from .typings import (
     Attributes,
     InputTraits,
+    MintRequest,
     MintResponse,
     PublishResponse,
     Traits,
 )
 
+logger = logging.getLogger(__name__)
 
-def mint(approved_address: str, input_traits: InputTraits) -> MintResponse:
+# (traits, traits hex, traits decimal, attributes)
+ResolvedTraits = Tuple[Traits, str, int, Attributes]
+
+# A batch item's mint response, or the error that failed it
+MintBatchResult = Union[MintResponse, Exception]
+
+
+async def mint(approved_address: str, input_traits: InputTraits) -> MintResponse:
     """
     Take a set of traits, generate the image and metadata, and sign it
+
+    Cheap local checks run first. Verification and the attribute-in-use
+    check then run concurrently with rendering, and nothing is pinned until
+    they pass. Any failure cancels the work still in flight.
     """
 
-    traits: Traits = input_traits_to_traits(input_traits)
-    print(traits)
+    with track_in_flight("mint"), time_stage("mint"):
+        return await mint_pipeline(approved_address, input_traits)
 
-    traits_hex: str = traits_to_hex(traits)
-    print(traits_hex)
 
-    traits_decimal: int = trait_hex_to_decimal(traits_hex)
-    print(traits_decimal)
+async def mint_pipeline(
+    approved_address: str,
+    input_traits: InputTraits,
+) -> MintResponse:
+    """
+    Run the stages of a single mint
+    """
 
-    attributes: Attributes = traits_to_attributes(traits)
-    print(attributes)
+    validate_address(approved_address)
 
-    published: PublishResponse = publish(traits, attributes, traits_hex)
-    print(published)
+    traits, traits_hex, traits_decimal, attributes = resolve_traits(input_traits)
 
-    signature: str = sign(
-        approved_address,
-        published["metadata_ipfs_hash_base16_bytes32"],
-        traits_hex,
+    gates: asyncio.Future[None] = asyncio.ensure_future(
+        check_mint_gates(approved_address, traits_hex)
     )
 
+    publishing: asyncio.Future[PublishResponse] = asyncio.ensure_future(
+        publish(traits, attributes, traits_hex, gates)
+    )
+
+    try:
+        await gates
+        published: PublishResponse = await publishing
+    except BaseException:
+        gates.cancel()
+        publishing.cancel()
+
+        # Collect the outcome of both so neither is left unretrieved
+        await asyncio.gather(gates, publishing, return_exceptions=True)
+
+        raise
+
+    logger.debug("Published", extra={"fields": {"published": published}})
+
+    with time_stage("sign"):
+        signature: str = await asyncio.to_thread(
+            sign,
+            approved_address,
+            published["metadata_ipfs_hash_base16_bytes32"],
+            traits_hex,
+        )
+
     return {
         "approved_address": approved_address,
         "traits": traits,
@@ -54,3 +100,249 @@ def mint(approved_address: str, input_traits: InputTraits) -> MintResponse:
         "published": published,
         "signature": signature,
     }
+
+
+def resolve_traits(input_traits: InputTraits) -> ResolvedTraits:
+    """
+    Resolve input traits into traits, their hex and decimal forms and
+    attributes
+    """
+
+    with time_stage("resolve_traits"):
+        traits: Traits = input_traits_to_traits(input_traits)
+        traits_hex: str = traits_to_hex(traits)
+        traits_decimal: int = trait_hex_to_decimal(traits_hex)
+        attributes: Attributes = traits_to_attributes(traits)
+
+    logger.debug(
+        "Resolved traits",
+        extra={
+            "fields": {
+                "traits": traits,
+                "traits_hex": traits_hex,
+                "traits_decimal": traits_decimal,
+                "attributes": attributes,
+            }
+        },
+    )
+
+    return traits, traits_hex, traits_decimal, attributes
+
+
+async def mint_batch(mint_requests: List[MintRequest]) -> List[MintBatchResult]:
+    """
+    Mint many address and trait pairs in one pass
+
+    Each address is verified once and each distinct trait combination is
+    checked, rendered and pinned once, with up to MINT_BATCH_CONCURRENCY
+    combinations publishing at a time. Items fail individually; results are
+    returned in request order.
+    """
+
+    with track_in_flight("mint_batch"), time_stage("mint_batch"):
+        return await mint_batch_pipeline(mint_requests)
+
+
+async def mint_batch_pipeline(
+    mint_requests: List[MintRequest],
+) -> List[MintBatchResult]:
+    """
+    Run the stages of a batch mint
+    """
+
+    results: List[Optional[MintBatchResult]] = [None] * len(mint_requests)
+    resolved: Dict[int, ResolvedTraits] = {}
+
+    for index, mint_request in enumerate(mint_requests):
+        try:
+            if "address" not in mint_request:
+                raise Exception("Missing address parameter")
+
+            if "traits" not in mint_request:
+                raise Exception("Missing traits parameter")
+
+            validate_address(mint_request["address"])
+            resolved[index] = resolve_traits(mint_request["traits"])
+        except Exception as error:
+            results[index] = error
+
+    verifications: Dict[str, asyncio.Future[bool]] = {}
+    groups: Dict[str, List[int]] = {}
+
+    for index, (_, traits_hex, _, _) in resolved.items():
+        address: str = mint_requests[index]["address"]
+
+        if address not in verifications:
+            verifications[address] = asyncio.ensure_future(verify_address(address))
+
+        groups.setdefault(traits_hex, []).append(index)
+
+    semaphore: asyncio.Semaphore = asyncio.Semaphore(MINT_BATCH_CONCURRENCY)
+    gates: Dict[str, asyncio.Future[None]] = {}
+    publishing: Dict[str, asyncio.Future[PublishResponse]] = {}
+
+    for traits_hex, indexes in groups.items():
+        traits, _, _, attributes = resolved[indexes[0]]
+
+        gates[traits_hex] = asyncio.ensure_future(
+            check_batch_gates(
+                traits_hex,
+                [verifications[mint_requests[i]["address"]] for i in indexes],
+            )
+        )
+
+        publishing[traits_hex] = asyncio.ensure_future(
+            publish_with_limit(
+                semaphore,
+                traits,
+                attributes,
+                traits_hex,
+                gates[traits_hex],
+            )
+        )
+
+    pending: List[asyncio.Future] = [
+        *verifications.values(),
+        *gates.values(),
+        *publishing.values(),
+    ]
+
+    try:
+        await asyncio.gather(*pending, return_exceptions=True)
+    except BaseException:
+        for future in pending:
+            future.cancel()
+
+        await asyncio.gather(*pending, return_exceptions=True)
+
+        raise
+
+    signing: Dict[int, asyncio.Future[str]] = {}
+
+    for index, (_, traits_hex, _, _) in resolved.items():
+        address = mint_requests[index]["address"]
+        verification: asyncio.Future[bool] = verifications[address]
+
+        if verification.exception() is not None:
+            results[index] = verification.exception()
+        elif verification.result() is False:
+            results[index] = Exception("Address is not allowed to mint")
+        elif publishing[traits_hex].exception() is not None:
+            results[index] = publishing[traits_hex].exception()
+        else:
+            signing[index] = asyncio.ensure_future(
+                asyncio.to_thread(
+                    sign,
+                    address,
+                    publishing[traits_hex].result()[
+                        "metadata_ipfs_hash_base16_bytes32"
+                    ],
+                    traits_hex,
+                )
+            )
+
+    with time_stage("sign"):
+        await asyncio.gather(*signing.values(), return_exceptions=True)
+
+    for index, signature in signing.items():
+        if signature.exception() is not None:
+            results[index] = signature.exception()
+            continue
+
+        traits, traits_hex, traits_decimal, attributes = resolved[index]
+
+        results[index] = {
+            "approved_address": mint_requests[index]["address"],
+            "traits": traits,
+            "traits_hex": traits_hex,
+            "traits_decimal": traits_decimal,
+            "attributes": attributes,
+            "published": publishing[traits_hex].result(),
+            "signature": signature.result(),
+        }
+
+    return results
+
+
+async def verify_address(address: str) -> bool:
+    """
+    Check if an address is verified, off the event loop
+    """
+
+    with time_stage("verify"):
+        return await asyncio.to_thread(is_verified, address)
+
+
+async def publish_with_limit(
+    semaphore: asyncio.Semaphore,
+    traits: Traits,
+    attributes: Attributes,
+    traits_hex: str,
+    ready: asyncio.Future[None],
+) -> PublishResponse:
+    """
+    Publish once a batch publishing slot is free
+    """
+
+    async with semaphore:
+        return await publish(traits, attributes, traits_hex, ready)
+
+
+async def check_batch_gates(
+    traits_hex: str,
+    verifications: List[asyncio.Future[bool]],
+):
+    """
+    Check a batch's trait combination is unused and at least one address
+    requesting it may mint
+    """
+
+    with time_stage("attribute"):
+        in_use: bool = await asyncio.to_thread(is_attribute_in_use, traits_hex)
+
+    if in_use is True:
+        raise Exception("Attribute combination already in use")
+
+    # Verifications are shared across combinations, so wait without
+    # cancelling them if this check is cancelled
+    await asyncio.wait(verifications)
+
+    if not any(
+        verification.exception() is None and verification.result() is True
+        for verification in verifications
+    ):
+        raise Exception("Address is not allowed to mint")
+
+
+async def check_mint_gates(approved_address: str, traits_hex: str):
+    """
+    Check the address may mint and the attribute combination is unused
+    """
+
+    async def check_verified():
+        with time_stage("verify"):
+            verified: bool = await asyncio.to_thread(is_verified, approved_address)
+
+        if verified is False:
+            raise Exception("Address is not allowed to mint")
+
+    async def check_attribute_unused():
+        with time_stage("attribute"):
+            in_use: bool = await asyncio.to_thread(is_attribute_in_use, traits_hex)
+
+        if in_use is True:
+            raise Exception("Attribute combination already in use")
+
+    checks: List[asyncio.Future[None]] = [
+        asyncio.ensure_future(check_verified()),
+        asyncio.ensure_future(check_attribute_unused()),
+    ]
+
+    try:
+        await asyncio.gather(*checks)
+    except BaseException:
+        # Fail on the first failed check without waiting for the other
+        for check in checks:
+            check.cancel()
+
+        raise
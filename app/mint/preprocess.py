@@ -0,0 +1,121 @@
+"""
+Crop layer assets to their visible pixels ahead of rendering
+"""
+
+import json
+import logging
+import os
+from typing import Dict, List, Optional, TypedDict
+from PIL import Image
+from .catalog import LAYERS_INPUT_PATH
+from .layer_images import (
+    PREPROCESSED_INDEX_PATH,
+    PREPROCESSED_PATH,
+    LayerImage,
+    LayerSource,
+    PreprocessedLayer,
+    get_catalog_layer_sources,
+    get_preprocessed_layers,
+)
+
+logger = logging.getLogger(__name__)
+
+
+class PreprocessResult(TypedDict):
+    layers: int
+    converted: int
+    skipped: int
+    source_pixels: int
+    cropped_pixels: int
+
+
+def get_preprocessed_path(source: LayerSource) -> str:
+    """
+    Get where the cropped copy of a layer asset is written, mirroring the
+    layout of the input folder
+    """
+
+    return f"{PREPROCESSED_PATH}/{os.path.relpath(source[2], LAYERS_INPUT_PATH)}"
+
+
+def preprocess_layers(force: bool = False) -> PreprocessResult:
+    """
+    Write the RGBA crop of every catalog layer and the index describing them
+
+    Layers whose source is unchanged since the last run are skipped unless
+    forced. The index is replaced atomically, so running workers pick up
+    either the old or the new set.
+    """
+
+    previous: Dict[str, PreprocessedLayer] = get_preprocessed_layers()
+    index: Dict[str, PreprocessedLayer] = {}
+
+    result: PreprocessResult = {
+        "layers": 0,
+        "converted": 0,
+        "skipped": 0,
+        "source_pixels": 0,
+        "cropped_pixels": 0,
+    }
+
+    sources: List[LayerSource] = get_catalog_layer_sources()
+
+    for source in sources:
+        path: str = source[2]
+
+        try:
+            mtime: int = os.stat(path).st_mtime_ns
+        except OSError as error:
+            logger.warning("Failed to preprocess layer: %s %s", path, error)
+            continue
+
+        result["layers"] += 1
+
+        entry: Optional[PreprocessedLayer] = previous.get(path)
+
+        if (
+            force is False
+            and entry is not None
+            and entry["mtime"] == mtime
+            and os.path.exists(entry["path"])
+        ):
+            index[path] = entry
+            result["skipped"] += 1
+        else:
+            with Image.open(path) as source_image:
+                layer_image: LayerImage = LayerImage.from_image(
+                    source_image.convert("RGBA")
+                )
+
+            # Fully transparent layers are kept as a single clear pixel
+            cropped_image: Image.Image = layer_image.image or Image.new("RGBA", (1, 1))
+
+            entry = {
+                "path": get_preprocessed_path(source),
+                "mtime": mtime,
+                "offset": layer_image.offset,
+                "size": layer_image.size,
+            }
+
+            os.makedirs(os.path.dirname(entry["path"]), exist_ok=True)
+            cropped_image.save(entry["path"], format="PNG", compress_level=1)
+
+            index[path] = entry
+            result["converted"] += 1
+
+        width, height = entry["size"]
+        result["source_pixels"] += width * height
+
+        with Image.open(entry["path"]) as cropped_image:
+            result["cropped_pixels"] += cropped_image.width * cropped_image.height
+
+    os.makedirs(PREPROCESSED_PATH, exist_ok=True)
+
+    temporary_path: str = f"{PREPROCESSED_INDEX_PATH}.tmp"
+
+    with open(temporary_path, "w", encoding="utf-8") as outfile:
+        json.dump(index, outfile, indent=2)
+
+    os.replace(temporary_path, PREPROCESSED_INDEX_PATH)
+
+    return result
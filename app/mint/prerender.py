@@ -0,0 +1,394 @@
+"""
+Pre-render popular trait combinations, and partial stacks of their first
+layers, while the worker is idle
+"""
+
+import asyncio
+import logging
+import time
+from typing import Dict, List, Optional, Tuple
+from ..cache import LRUCache
+from .attributes import traits_to_hex
+from .catalog import get_catalog
+from .config import (
+    PRERENDER_ENABLED,
+    PRERENDER_IDLE_SECONDS,
+    PRERENDER_INTERVAL,
+    PRERENDER_MAX_BYTES,
+    PRERENDER_MAX_TRACKED,
+    PRERENDER_TOP_K,
+)
+from .compositing import PartialStack
+from .layer_images import (
+    LayerKey,
+    get_base_layer_source,
+    get_layer_key,
+    get_trait_layer_source,
+)
+from .publish_cache import get_cached_publish
+from .render_pool import (
+    composite_stack_in_pool,
+    render_image_in_pool,
+    render_pool_stats,
+)
+from .typings import Trait, Traits
+
+logger = logging.getLogger(__name__)
+
+# (layer name, option id)
+LayerOptionKey = Tuple[str, int]
+
+# (kind, layers config digest, key of the base layer and each trait's layer)
+RenderKey = Tuple[str, str, Tuple[LayerKey, ...]]
+
+# Rendered PNGs and raw RGB partial stacks, never pinned until a mint asks
+# for them. Keys change with the layers config and layer asset mtimes.
+prerendered_images: LRUCache[bytes] = LRUCache(PRERENDER_MAX_BYTES)
+
+prerender_stats: Dict[str, int] = {
+    "rendered": 0,
+    "failed": 0,
+    "used": 0,
+    "stacks_rendered": 0,
+    "stacks_used": 0,
+}
+
+_warmer: Optional["asyncio.Task[None]"] = None
+
+
+class PopularityTracker:
+    """
+    Request counts per trait combination and per layer option
+
+    Counts are halved whenever more than max_tracked combinations are held,
+    so old favourites fade and memory stays bounded.
+    """
+
+    def __init__(self, max_tracked: int):
+        self.max_tracked: int = max_tracked
+        self.last_seen_at: float = 0.0
+        self.requests: int = 0
+
+        # traits hex -> (count, traits)
+        self.combinations: Dict[str, Tuple[float, Traits]] = {}
+        self.layer_options: Dict[LayerOptionKey, Tuple[float, Trait]] = {}
+
+        # First layers of a combination -> (count, their traits)
+        self.stacks: Dict[Tuple[LayerOptionKey, ...], Tuple[float, Traits]] = {}
+
+    def track(self, traits: Traits, traits_hex: str):
+        """
+        Count a request for a trait combination
+        """
+
+        self.last_seen_at = time.monotonic()
+        self.requests += 1
+
+        count, _ = self.combinations.get(traits_hex, (0.0, traits))
+        self.combinations[traits_hex] = (count + 1, traits)
+
+        stack_key: Tuple[LayerOptionKey, ...] = ()
+
+        for depth, trait in enumerate(traits, 1):
+            key: LayerOptionKey = (trait["name"].lower(), trait["option"]["id"])
+            count, _ = self.layer_options.get(key, (0.0, trait))
+            self.layer_options[key] = (count + 1, trait)
+
+            # The full stack is the combination itself
+            if depth < len(traits):
+                stack_key += (key,)
+                count, _ = self.stacks.get(stack_key, (0.0, traits[:depth]))
+                self.stacks[stack_key] = (count + 1, traits[:depth])
+
+        if len(self.combinations) > self.max_tracked:
+            self.decay()
+
+    def decay(self):
+        """
+        Halve every count, forgetting those that fall below one request
+        """
+
+        self.combinations = {
+            traits_hex: (count / 2, traits)
+            for traits_hex, (count, traits) in self.combinations.items()
+            if count >= 2
+        }
+
+        self.layer_options = {
+            key: (count / 2, trait)
+            for key, (count, trait) in self.layer_options.items()
+            if count >= 2
+        }
+
+        self.stacks = {
+            key: (count / 2, traits)
+            for key, (count, traits) in self.stacks.items()
+            if count >= 2
+        }
+
+    def get_popular_combinations(self, count: int) -> List[Tuple[str, Traits]]:
+        """
+        Get the most requested combinations, then the combination of each
+        layer's most requested option, as (traits hex, traits)
+        """
+
+        ranked: List[Tuple[str, Tuple[float, Traits]]] = sorted(
+            self.combinations.items(),
+            key=lambda entry: entry[1][0],
+            reverse=True,
+        )
+
+        popular: List[Tuple[str, Traits]] = [
+            (traits_hex, traits) for traits_hex, (_, traits) in ranked[:count]
+        ]
+
+        favourites: Dict[str, Tuple[float, Trait]] = {}
+
+        for (layer_name, _), (option_count, trait) in self.layer_options.items():
+            if option_count > favourites.get(layer_name, (0.0, trait))[0]:
+                favourites[layer_name] = (option_count, trait)
+
+        if len(favourites) > 0:
+            favourite_traits: Traits = sorted(
+                (trait for _, trait in favourites.values()),
+                key=lambda trait: trait["id"],
+            )
+
+            favourite_hex: str = traits_to_hex(favourite_traits)
+
+            if favourite_hex not in dict(popular):
+                popular.append((favourite_hex, favourite_traits))
+
+        return popular
+
+    def get_popular_stacks(self, count: int) -> List[Traits]:
+        """
+        Get the first layers shared by repeated requests, ranked by how many
+        layer composites reusing them would save
+        """
+
+        ranked: List[Tuple[float, Traits]] = sorted(
+            (
+                (stack_count * len(traits), traits)
+                for stack_count, traits in self.stacks.values()
+                if stack_count >= 2
+            ),
+            key=lambda entry: entry[0],
+            reverse=True,
+        )
+
+        return [traits for _, traits in ranked[:count]]
+
+
+popularity_tracker: PopularityTracker = PopularityTracker(PRERENDER_MAX_TRACKED)
+
+
+def track_request(traits: Traits, traits_hex: str):
+    """
+    Count a request for a trait combination towards pre-rendering
+    """
+
+    if PRERENDER_ENABLED is True:
+        popularity_tracker.track(traits, traits_hex)
+
+
+def get_layer_keys(traits: Traits) -> Tuple[LayerKey, ...]:
+    """
+    Get the cache keys of the base layer and each trait's layer, which change
+    with the layer asset mtimes
+    """
+
+    return (
+        get_layer_key(get_base_layer_source()),
+        *(get_layer_key(get_trait_layer_source(trait)) for trait in traits),
+    )
+
+
+def get_render_key(kind: str, layer_keys: Tuple[LayerKey, ...]) -> RenderKey:
+    """
+    Get the cache key of a pre-rendered image or partial stack
+    """
+
+    return (kind, get_catalog().digest, layer_keys)
+
+
+def get_prerendered_image(traits: Traits) -> Optional[bytes]:
+    """
+    Get a pre-rendered PNG for a trait combination, if its layers are unchanged
+    """
+
+    try:
+        key: RenderKey = get_render_key("image", get_layer_keys(traits))
+    except OSError:
+        return None
+
+    image: Optional[bytes] = prerendered_images.get(key)
+
+    if image is not None:
+        prerender_stats["used"] += 1
+
+    return image
+
+
+def get_prerendered_stack(traits: Traits) -> Optional[PartialStack]:
+    """
+    Get the deepest pre-rendered partial stack of a trait combination's
+    first layers, if those layers are unchanged
+    """
+
+    try:
+        layer_keys: Tuple[LayerKey, ...] = get_layer_keys(traits)
+    except OSError:
+        return None
+
+    for depth in range(len(traits) - 1, 0, -1):
+        pixels: Optional[bytes] = prerendered_images.get(
+            get_render_key("stack", layer_keys[: depth + 1])
+        )
+
+        if pixels is not None:
+            prerender_stats["stacks_used"] += 1
+            return depth, pixels
+
+    return None
+
+
+def is_idle() -> bool:
+    """
+    Check the worker has no renders running and has not seen a request lately
+    """
+
+    return (
+        render_pool_stats["in_flight"] == 0
+        and time.monotonic() - popularity_tracker.last_seen_at >= PRERENDER_IDLE_SECONDS
+    )
+
+
+async def prerender_popular_combinations() -> bool:
+    """
+    Render popular combinations that are neither cached nor published, then
+    popular partial stacks, one at a time, stopping as soon as the worker is
+    busy
+
+    Returns whether everything popular was considered.
+    """
+
+    popular: List[Tuple[str, Traits]] = popularity_tracker.get_popular_combinations(
+        PRERENDER_TOP_K
+    )
+
+    for traits_hex, traits in popular:
+        if is_idle() is False:
+            return False
+
+        if await asyncio.to_thread(get_cached_publish, traits_hex) is not None:
+            continue
+
+        # Keyed before rendering, so a layer changed meanwhile is not hidden
+        try:
+            key: RenderKey = get_render_key("image", get_layer_keys(traits))
+        except OSError:
+            continue
+
+        if prerendered_images.get(key) is not None:
+            continue
+
+        try:
+            image: bytes = await render_image_in_pool(traits)
+        except Exception as error:
+            prerender_stats["failed"] += 1
+            logger.warning("Failed to pre-render %s: %s", traits_hex, error)
+            continue
+
+        prerendered_images.set(key, image, len(image))
+        prerender_stats["rendered"] += 1
+
+    for traits in popularity_tracker.get_popular_stacks(PRERENDER_TOP_K):
+        if is_idle() is False:
+            return False
+
+        try:
+            key = get_render_key("stack", get_layer_keys(traits))
+        except OSError:
+            continue
+
+        if prerendered_images.get(key) is not None:
+            continue
+
+        try:
+            pixels: bytes = await composite_stack_in_pool(traits)
+        except Exception as error:
+            prerender_stats["failed"] += 1
+            logger.warning("Failed to pre-render a partial stack: %s", error)
+            continue
+
+        prerendered_images.set(key, pixels, len(pixels))
+        prerender_stats["stacks_rendered"] += 1
+
+    return True
+
+
+async def run_prerender_warmer():
+    """
+    Pre-render popular combinations each interval while idle
+    """
+
+    # Request count at the last complete pass, to skip passes with no news
+    requests_at_last_pass: int = -1
+
+    while True:
+        await asyncio.sleep(PRERENDER_INTERVAL)
+
+        if is_idle() is False:
+            continue
+
+        requests: int = popularity_tracker.requests
+
+        if requests == requests_at_last_pass:
+            continue
+
+        try:
+            if await prerender_popular_combinations() is True:
+                requests_at_last_pass = requests
+        except Exception as error:
+            logger.error("Pre-render failed: %s", error)
+
+
+def start_prerender_warmer():
+    """
+    Start this worker's pre-render warmer, if enabled
+    """
+
+    # pylint: disable=global-statement
+    global _warmer
+
+    if PRERENDER_ENABLED is False or PRERENDER_MAX_BYTES <= 0 or _warmer is not None:
+        return
+
+    _warmer = asyncio.get_running_loop().create_task(run_prerender_warmer())
+
+
+def stop_prerender_warmer():
+    """
+    Stop this worker's pre-render warmer
+    """
+
+    # pylint: disable=global-statement
+    global _warmer
+
+    if _warmer is not None:
+        _warmer.cancel()
+        _warmer = None
+
+
+def get_prerender_stats() -> Dict[str, int]:
+    """
+    Get pre-render counters and cache usage
+    """
+
+    return {
+        **prerender_stats,
+        "tracked": len(popularity_tracker.combinations),
+        "tracked_stacks": len(popularity_tracker.stacks),
+        **{f"cache_{key}": value for key, value in prerendered_images.stats().items()},
+    }
@@ -0,0 +1,202 @@
+"""
+Render reduced resolution previews of trait combinations
+"""
+
+import hashlib
+import io
+import os
+from typing import Dict, List, Optional, Tuple, TypedDict
+from PIL import Image
+from ..cache import LRUCache
+from ..metrics import count_cache_lookup
+from ..timing import time_stage
+from .catalog import LAYERS_THUMBS_PATH, get_catalog, get_thumb_path
+from .compositing import paste_layer
+from .config import PREVIEW_CACHE_MAX_BYTES
+from .layer_images import (
+    LayerImage,
+    LayerSource,
+    get_base_layer_source,
+    get_layer_image,
+    get_layer_key,
+    get_trait_layer_source,
+    layer_image_cache,
+)
+from .typings import Traits
+
+PREVIEW_MEDIA_TYPES: Dict[str, str] = {
+    "webp": "image/webp",
+    "png": "image/png",
+}
+
+# (traits hex, size, format, catalog digest, layer and thumbnail versions)
+PreviewKey = Tuple[str, int, str, str, str]
+
+preview_cache: LRUCache[bytes] = LRUCache(PREVIEW_CACHE_MAX_BYTES)
+
+
+class Preview(TypedDict):
+    content: bytes
+    etag: str
+    media_type: str
+
+
+def get_preview_etag(key: PreviewKey) -> str:
+    """
+    Get the strong ETag of a preview
+    """
+
+    traits_hex, size, image_format, digest, assets_stamp = key
+
+    return f'"{traits_hex}-{size}-{image_format}-{digest[:16]}-{assets_stamp}"'
+
+
+def get_preview_sources(traits: Traits) -> List[Tuple[LayerSource, str]]:
+    """
+    Get the source and thumbnail path of the blank first layer and of each
+    trait's layer, in compositing order
+    """
+
+    return [
+        (get_base_layer_source(), f"{LAYERS_THUMBS_PATH}/base.png"),
+        *(
+            (
+                get_trait_layer_source(trait),
+                get_thumb_path(trait["name"], trait["option"]),
+            )
+            for trait in traits
+        ),
+    ]
+
+
+def get_mtime(path: str) -> int:
+    """
+    Get a file's mtime in nanoseconds, or 0 when it is missing
+    """
+
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+
+def get_preview_key(
+    traits: Traits,
+    traits_hex: str,
+    size: int,
+    image_format: str,
+) -> PreviewKey:
+    """
+    Get the cache key of a preview, which changes with the layers config and
+    with the mtimes of the layer and thumbnail assets it is made from
+    """
+
+    mtimes: List[int] = []
+
+    for (_, _, layer_path), thumb_path in get_preview_sources(traits):
+        mtimes.extend([get_mtime(layer_path), get_mtime(thumb_path)])
+
+    assets_stamp: str = hashlib.sha256(repr(mtimes).encode("utf-8")).hexdigest()
+
+    return (traits_hex, size, image_format, get_catalog().digest, assets_stamp[:16])
+
+
+def get_preview_layer_image(
+    source: LayerSource,
+    thumb_path: str,
+    size: int,
+) -> LayerImage:
+    """
+    Get a layer scaled so the canvas is size pixels wide
+
+    A thumbnail asset is used when one exists with the canvas's aspect
+    ratio, otherwise the full resolution layer is scaled down once.
+    """
+
+    thumb_mtime: int = get_mtime(thumb_path)
+
+    key: Tuple = ("preview", size, thumb_mtime) + get_layer_key(source)
+
+    layer_image: Optional[LayerImage] = layer_image_cache.get(key)
+
+    if layer_image is not None:
+        return layer_image
+
+    full_layer_image: LayerImage = get_layer_image(source)
+
+    width, height = full_layer_image.size
+    scaled_size: Tuple[int, int] = (size, max(1, round(height * size / width)))
+
+    image: Optional[Image.Image] = None
+
+    if thumb_mtime != 0:
+        with Image.open(thumb_path) as thumb_image:
+            if thumb_image.width * height == thumb_image.height * width:
+                image = thumb_image.convert("RGBA")
+
+    if image is None:
+        image = Image.new("RGBA", full_layer_image.size)
+
+        if full_layer_image.image is not None:
+            image.paste(full_layer_image.image, full_layer_image.offset)
+
+    if image.size != scaled_size:
+        image = image.resize(scaled_size, Image.LANCZOS)
+
+    layer_image = LayerImage.from_image(image)
+    layer_image_cache.set(key, layer_image, layer_image.nbytes)
+
+    return layer_image
+
+
+def render_preview(traits: Traits, size: int, image_format: str) -> bytes:
+    """
+    Composite a trait combination at preview size and encode it
+    """
+
+    sources: List[Tuple[LayerSource, str]] = get_preview_sources(traits)
+
+    base_image: LayerImage = get_preview_layer_image(*sources[0], size)
+
+    composite_image: Image.Image = Image.new("RGB", base_image.size)
+    paste_layer(composite_image, base_image)
+
+    for source, thumb_path in sources[1:]:
+        paste_layer(composite_image, get_preview_layer_image(source, thumb_path, size))
+
+    output: io.BytesIO = io.BytesIO()
+
+    if image_format == "webp":
+        composite_image.save(output, format="WEBP", quality=80, method=4)
+    else:
+        composite_image.save(output, format="PNG", compress_level=1)
+
+    return output.getvalue()
+
+
+def get_preview(
+    traits: Traits,
+    traits_hex: str,
+    size: int,
+    image_format: str,
+) -> Preview:
+    """
+    Get a cached or freshly rendered preview
+    """
+
+    key: PreviewKey = get_preview_key(traits, traits_hex, size, image_format)
+
+    content: Optional[bytes] = preview_cache.get(key)
+
+    count_cache_lookup("preview", content is not None)
+
+    if content is None:
+        with time_stage("preview_render"):
+            content = render_preview(traits, size, image_format)
+        preview_cache.set(key, content, len(content))
+
+    return {
+        "content": content,
+        "etag": get_preview_etag(key),
+        "media_type": PREVIEW_MEDIA_TYPES[image_format],
+    }
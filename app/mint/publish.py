@@ -2,15 +2,38 @@
 Handle generating an image and metadata and pinning them to IPFS
 """
 
+import asyncio
 import base64
 import json
+import logging
 import math
 import pathlib
-import io
 from datetime import datetime
-import requests
-from PIL import Image
-from .config import MINT_RESOURCE_PATH, PINATA_JWT, NFT_STORAGE_JWT
+from typing import Awaitable, Dict, Optional, Set
+import httpx
+from ..metrics import count_cache_lookup
+from ..timing import time_stage
+from .cid import get_ipfs_cid
+from .config import (
+    IPFS_CHUNK_SIZE,
+    IPFS_CID_VERIFY,
+    IPFS_LOCAL_CID,
+    IPFS_MAX_LINKS,
+    IPFS_PIN_PRECHECK,
+    MINT_RESOURCE_PATH,
+    NFT_STORAGE_API_URL,
+    NFT_STORAGE_JWT,
+    PINATA_API_URL,
+    PINATA_JWT,
+    PUBLISH_ARCHIVE,
+    PUBLISH_COALESCE,
+)
+from .http_client import get_http_client
+from .compositing import PartialStack
+from .prerender import get_prerendered_image, get_prerendered_stack, track_request
+from .publish_cache import get_cached_publish, set_cached_publish
+from .render_pool import render_image_in_pool
+from .single_flight import coalesce_publish, hold_publish_lock
 from .typings import (
     Attributes,
     MetaData,
@@ -26,6 +49,14 @@ from .typings import (
     Traits,
 )
 
+logger = logging.getLogger(__name__)
+
+IMAGE_FILE_NAME: str = "image.png"
+
+METADATA_FILE_NAME: str = "metadata.json"
+
+archive_tasks: Set[asyncio.Task[str]] = set()
+
 
 def ipfs_hash_to_base16(ipfs_hash: str) -> str:
     """
@@ -93,109 +124,190 @@ def get_paths(output_folder_name: str) -> ResourcePaths:
     return paths
 
 
-def create_image(
-    paths: ResourcePaths,
-    file_name: str,
-    traits: Traits,
-) -> str:
+def create_metadata(
+    attributes: Attributes,
+    image_ipfs_hash: str,
+) -> bytes:
     """
-    Generate NFT image
+    Generate NFT metadata
     """
 
-    # Setup paths
-    output_path: str = f"{paths['output']}/{file_name}"
-
-    # Get the blank first layer. This is used for sizing.
-    base_image_path: str = f"{paths['input']}/base.png"
-    image = Image.open(base_image_path).convert("RGBA")
-
-    # Start the new composite image with the blank layer
-    composite_image = Image.new("RGB", image.size)
-    composite_image.paste(image, (0, 0), image)
-
-    # Add each attribute's layer
-    for trait in traits:
-        trait_layer_folder_name: str = trait["name"].lower()
-
-        trait_layer_id_number: str = str(trait["option"]["id"]).lower()
+    # Make IPFS Hash a URL
+    image_ipfs_url: str = f"ipfs://{image_ipfs_hash}"
 
-        trait_layer_id_number_padded: str = trait_layer_id_number.rjust(3, "0")
+    # Assemble metadata
+    metadata: MetaData = {
+        "name": "Song-A-Day PFP",
+        "description": "Song-A-Day PFP",
+        "attributes": attributes,
+        "image": image_ipfs_url,
+    }
 
-        trait_layer_file_name: str = trait["option"]["name"].lower()
+    return json.dumps(metadata).encode("utf-8")
 
-        trait_layer_file_ext: str = trait["option"]["ext"].lower()
 
-        # pylint: disable=consider-using-f-string
-        image_path: str = "{}/{}/{}-{}.{}".format(
-            paths["input"],
-            trait_layer_folder_name,
-            trait_layer_id_number_padded,
-            trait_layer_file_name,
-            trait_layer_file_ext,
-        )
-        # pylint: enable=consider-using-f-string
+def archive_files(output_folder_name: str, files: Dict[str, bytes]) -> str:
+    """
+    Write published files to a new output folder
+    """
 
-        image = Image.open(image_path).convert("RGBA")
-        composite_image.paste(image, (0, 0), image)
+    # Get image and metadata paths
+    paths: ResourcePaths = get_paths(output_folder_name)
 
-    # Write the final image to disk
-    composite_image.save(output_path, "PNG")
+    for file_name, data in files.items():
+        with open(f"{paths['output']}/{file_name}", "wb") as outfile:
+            outfile.write(data)
 
-    return output_path
+    return paths["output"]
 
 
-def create_metadata(
-    paths: ResourcePaths,
-    file_name: str,
-    attributes: Attributes,
-    image_ipfs_hash: str,
+async def archive_files_in_background(
+    output_folder_name: str,
+    files: Dict[str, bytes],
 ) -> str:
     """
-    Generate NFT metadata
+    Write published files to disk, logging rather than raising on failure
     """
 
-    # Setup paths
-    output_path: str = f"{paths['output']}/{file_name}"
+    try:
+        return await asyncio.to_thread(archive_files, output_folder_name, files)
+    except Exception as error:
+        logger.warning("Failed to archive files: %s %s", output_folder_name, error)
+        return ""
 
-    # Make IPFS Hash a URL
-    image_ipfs_url: str = f"ipfs://{image_ipfs_hash}"
 
-    # Assemble metadata
-    metadata: MetaData = {
-        "name": "Song-A-Day PFP",
-        "description": "Song-A-Day PFP",
-        "attributes": attributes,
-        "image": image_ipfs_url,
-    }
+def archive_published_files(output_folder_name: str, files: Dict[str, bytes]):
+    """
+    Archive published files off the request path
+    """
 
-    # Write the metadata to disk
-    with open(output_path, "w", encoding="utf-8") as outfile:
-        json.dump(metadata, outfile)
+    task: asyncio.Task[str] = asyncio.create_task(
+        archive_files_in_background(output_folder_name, files)
+    )
 
-    return output_path
+    # Hold a reference so the task isn't garbage collected mid-write
+    archive_tasks.add(task)
+    task.add_done_callback(archive_tasks.discard)
 
 
-def pin_file_to_ipfs(
-    path: str,
+async def pin_file_to_ipfs(
+    data: bytes,
     name: str,
     mime: str,
     keyvalues: PinataKeyValues,
+    expected_ipfs_hash: Optional[str] = None,
 ) -> str:
     """
-    Pin a file to IPFS
+    Pin file contents to IPFS
+
+    When the locally computed CID is given, content the service already has
+    pinned can be skipped, and the service's CID is checked against it.
     """
 
+    if expected_ipfs_hash is not None and IPFS_PIN_PRECHECK is True:
+        with time_stage("pin_precheck"):
+            pinned: bool = await is_pinned(expected_ipfs_hash)
+
+        if pinned is True:
+            return expected_ipfs_hash
+
     if NFT_STORAGE_JWT != "":
-        return pin_file_to_ipfs_via_nft_storage(path, name, mime)
+        with time_stage("pin_nft_storage"):
+            ipfs_hash: str = await pin_file_to_ipfs_via_nft_storage(data, name, mime)
     elif PINATA_JWT != "":
-        return pin_file_to_ipfs_via_pinata(path, name, mime, keyvalues)
+        with time_stage("pin_pinata"):
+            ipfs_hash = await pin_file_to_ipfs_via_pinata(
+                data,
+                name,
+                mime,
+                keyvalues,
+            )
     else:
-        print("Missing Pinning Service Authorization Token")
+        logger.error("Missing Pinning Service Authorization Token")
         raise Exception("Missing Pinning Service Authorization Token")
 
+    if (
+        expected_ipfs_hash is not None
+        and IPFS_CID_VERIFY is True
+        and ipfs_hash.lower() != expected_ipfs_hash.lower()
+    ):
+        logger.error(
+            "IPFS hash mismatch: %s %s != %s", name, ipfs_hash, expected_ipfs_hash
+        )
+        raise Exception("Pinned IPFS hash does not match the local IPFS hash")
+
+    return ipfs_hash
+
+
+async def is_pinned(ipfs_hash: str) -> bool:
+    """
+    Check if content is already pinned by the pinning service
+    """
+
+    try:
+        if NFT_STORAGE_JWT != "":
+            return await is_pinned_via_nft_storage(ipfs_hash)
+        elif PINATA_JWT != "":
+            return await is_pinned_via_pinata(ipfs_hash)
+    except Exception as error:
+        logger.warning("Failed to check IPFS pin: %s %s", ipfs_hash, error)
+
+    return False
+
+
+async def is_pinned_via_pinata(ipfs_hash: str) -> bool:
+    """
+    Check if content is already pinned via Pinata
+    """
+
+    url: str = f"{PINATA_API_URL}/data/pinList"
+
+    headers = {
+        "Accept": "application/json",
+        "Authorization": f"Bearer {PINATA_JWT}",
+    }
+
+    response: httpx.Response = await get_http_client().get(
+        url=url,
+        headers=headers,
+        params={"cid": ipfs_hash, "status": "pinned", "pageLimit": "1"},
+    )
+
+    if response.is_success is False:
+        return False
+
+    return int(response.json().get("count", 0)) > 0
+
+
+async def is_pinned_via_nft_storage(ipfs_hash: str) -> bool:
+    """
+    Check if content is already pinned via NFT.Storage
+    """
+
+    url: str = f"{NFT_STORAGE_API_URL}/check/{ipfs_hash}"
 
-def pin_file_to_ipfs_via_pinata(
-    path: str,
+    headers = {
+        "Accept": "application/json",
+    }
+
+    response: httpx.Response = await get_http_client().get(
+        url=url,
+        headers=headers,
+    )
+
+    if response.is_success is False:
+        return False
+
+    response_json = response.json()
+
+    return (
+        response_json.get("ok") is True
+        and response_json.get("value", {}).get("pin", {}).get("status") == "pinned"
+    )
+
+
+async def pin_file_to_ipfs_via_pinata(
+    data: bytes,
     name: str,
     mime: str,
     keyvalues: PinataKeyValues,
@@ -204,83 +316,81 @@ def pin_file_to_ipfs_via_pinata(
     Pin a file to IPFS via Pinata
     """
 
-    url: str = "https://api.pinata.cloud/pinning/pinFileToIPFS"
+    url: str = f"{PINATA_API_URL}/pinning/pinFileToIPFS"
 
     headers = {
         "Accept": "application/json",
         "Authorization": f"Bearer {PINATA_JWT}",
     }
 
-    file: io.BufferedReader = open(path, "rb")
-
     files: PinataFiles = [
-        ("file", (name, file, mime)),
+        ("file", (name, data, mime)),
     ]
 
-    data: PinataData = {
+    form: PinataData = {
         "pinataMetadata": json.dumps({"keyvalues": keyvalues}),
         "pinataOptions": json.dumps({"cidVersion": 1}),
     }
 
-    response: requests.Response = requests.post(
+    response: httpx.Response = await get_http_client().post(
         url=url,
         headers=headers,
         files=files,
-        data=data,
+        data=form,
     )
-    print(response)
-
     response_json: PinataResponse = response.json()
-    print(response_json)
 
-    if response.ok is False:
-        print(f"Failed to PIN to IPFS: {name}")
+    logger.debug(
+        "Pinata responded",
+        extra={"fields": {"status": response.status_code, "body": response_json}},
+    )
+
+    if response.is_success is False:
+        logger.error("Failed to PIN to IPFS: %s", name)
         raise Exception("Failed to PIN to IPFS")
 
     if "IpfsHash" not in response_json or response_json["IpfsHash"] == "":
-        print(f"Failed to get IPFS hash: {name}")
+        logger.error("Failed to get IPFS hash: %s", name)
         raise Exception("Failed to get IPFS hash")
 
     return response_json["IpfsHash"]
 
 
-def pin_file_to_ipfs_via_nft_storage(path: str, name: str, mime: str) -> str:
+async def pin_file_to_ipfs_via_nft_storage(
+    data: bytes,
+    name: str,
+    mime: str,
+) -> str:
     """
     Pin a file to IPFS via NFT.Storage
     """
 
-    url: str = "https://api.nft.storage/upload"
+    url: str = f"{NFT_STORAGE_API_URL}/upload"
 
     headers = {
         "Accept": "application/json",
         "Authorization": f"Bearer {NFT_STORAGE_JWT}",
+        "Content-Type": mime,
     }
 
-    file: io.BufferedReader = open(path, "rb")
-
-    # files: PinataFiles = [
-    #     ("file", (name, file, mime)),
-    # ]
-
-    data: io.BufferedReader = file
-
-    response: requests.Response = requests.post(
+    response: httpx.Response = await get_http_client().post(
         url=url,
         headers=headers,
-        # files=files,
-        data=data,
+        content=data,
     )
-    print(response)
-
     response_json: NFTStorageResponse = response.json()
-    print(response_json)
 
-    if response.ok is False:
-        print(f"Failed to PIN to IPFS: {name}")
+    logger.debug(
+        "NFT.Storage responded",
+        extra={"fields": {"status": response.status_code, "body": response_json}},
+    )
+
+    if response.is_success is False:
+        logger.error("Failed to PIN to IPFS: %s", name)
         raise Exception("Failed to PIN to IPFS")
 
     if "ok" not in response_json or response_json["ok"] is False:
-        print(f"Failed to get IPFS hash: {name}")
+        logger.error("Failed to get IPFS hash: %s", name)
         raise Exception("Failed to get IPFS hash")
 
     if (
@@ -288,62 +398,188 @@ def pin_file_to_ipfs_via_nft_storage(path: str, name: str, mime: str) -> str:
         or "cid" not in response_json["value"]
         or response_json["value"]["cid"] == ""
     ):
-        print(f"Failed to get IPFS hash: {name}")
+        logger.error("Failed to get IPFS hash: %s", name)
         raise Exception("Failed to get IPFS hash")
 
     return response_json["value"]["cid"]
 
 
-def publish(
+async def archive_publish(traits_hex: str, image: bytes, metadata: bytes):
+    """
+    Archive a published image and metadata as configured by PUBLISH_ARCHIVE
+    """
+
+    files: Dict[str, bytes] = {
+        IMAGE_FILE_NAME: image,
+        METADATA_FILE_NAME: metadata,
+    }
+
+    if PUBLISH_ARCHIVE == "sync":
+        await asyncio.to_thread(archive_files, traits_hex, files)
+    elif PUBLISH_ARCHIVE == "async":
+        archive_published_files(traits_hex, files)
+
+
+async def publish(
     traits: Traits,
     attributes: Attributes,
     traits_hex: str,
+    ready: Optional[Awaitable[None]] = None,
 ) -> PublishResponse:
     """
     Generate an image and metadata and pin them to IPFS
+
+    Rendering starts straight away, but nothing is written or pinned until
+    ready, if given, has completed. Files are pinned from memory. Concurrent
+    publishes of the same combination share one render and one set of pins.
+    """
+
+    track_request(traits, traits_hex)
+
+    # Reuse a previous publish of the same trait combination
+    with time_stage("publish_cache"):
+        cached_published: Optional[PublishResponse] = await asyncio.to_thread(
+            get_cached_publish,
+            traits_hex,
+        )
+
+    count_cache_lookup("publish", cached_published is not None)
+
+    if cached_published is not None:
+        if ready is not None:
+            await ready
+
+        return cached_published
+
+    if PUBLISH_COALESCE is False:
+        return await publish_uncached(traits, attributes, traits_hex, ready)
+
+    return await coalesce_publish(
+        traits_hex,
+        ready,
+        lambda cleared: publish_uncached(traits, attributes, traits_hex, cleared),
+    )
+
+
+async def publish_uncached(
+    traits: Traits,
+    attributes: Attributes,
+    traits_hex: str,
+    ready: Optional[Awaitable[None]],
+) -> PublishResponse:
+    """
+    Render, pin and cache a trait combination, unless another worker
+    publishes it first
     """
 
-    metadata_file_name: str = "metadata.json"
-    image_file_name: str = "image.png"
-    metadata_name: str = f"{traits_hex}-{metadata_file_name}"
-    image_name: str = f"{traits_hex}-{image_file_name}"
+    async with hold_publish_lock(traits_hex) as locked:
+        if locked is True:
+            # Another worker may have published while this one waited
+            cached_published: Optional[PublishResponse] = await asyncio.to_thread(
+                get_cached_publish,
+                traits_hex,
+            )
+
+            count_cache_lookup("publish_locked", cached_published is not None)
+
+            if cached_published is not None:
+                if ready is not None:
+                    await ready
+
+                return cached_published
+
+        return await render_and_pin(traits, attributes, traits_hex, ready)
+
+
+async def render_and_pin(
+    traits: Traits,
+    attributes: Attributes,
+    traits_hex: str,
+    ready: Optional[Awaitable[None]],
+) -> PublishResponse:
+    """
+    Render a trait combination, then pin and cache it once ready
+    """
+
+    metadata_name: str = f"{traits_hex}-{METADATA_FILE_NAME}"
+    image_name: str = f"{traits_hex}-{IMAGE_FILE_NAME}"
     keyvalues: PinataKeyValues = {
         "traitsHex": traits_hex,
     }
 
-    # Get image and metadata paths
-    paths: ResourcePaths = get_paths(traits_hex)
+    # Render image, unless it was pre-rendered while idle
+    image: Optional[bytes] = get_prerendered_image(traits)
 
-    # Create image
-    image_path: str = create_image(
-        paths,
-        image_file_name,
-        traits,
-    )
+    count_cache_lookup("prerender", image is not None)
 
-    # PIN image
-    image_ipfs_hash: str = pin_file_to_ipfs(
-        image_path,
-        image_name,
-        "image/png",
-        keyvalues,
-    )
+    if image is None:
+        # Continue from pre-rendered first layers where there are some
+        stack: Optional[PartialStack] = get_prerendered_stack(traits)
 
-    # Create metadata
-    metadata_path: str = create_metadata(
-        paths,
-        metadata_file_name,
-        attributes,
-        image_ipfs_hash,
-    )
+        count_cache_lookup("prerender_stack", stack is not None)
 
-    # Pin metadata
-    metadata_ipfs_hash: str = pin_file_to_ipfs(
-        metadata_path,
-        metadata_name,
-        "text/json",
-        keyvalues,
-    )
+        with time_stage("render"):
+            image = await render_image_in_pool(traits, stack)
+
+    if ready is not None:
+        await ready
+
+    if IPFS_LOCAL_CID is True:
+        # Knowing the image CID up front lets both pins run concurrently
+        image_ipfs_hash: str = get_ipfs_cid(image, IPFS_CHUNK_SIZE, IPFS_MAX_LINKS)
+
+        metadata: bytes = create_metadata(attributes, image_ipfs_hash)
+
+        metadata_ipfs_hash: str = get_ipfs_cid(
+            metadata,
+            IPFS_CHUNK_SIZE,
+            IPFS_MAX_LINKS,
+        )
+
+        with time_stage("archive"):
+            await archive_publish(traits_hex, image, metadata)
+
+        with time_stage("pin"):
+            await asyncio.gather(
+                pin_file_to_ipfs(
+                    image,
+                    image_name,
+                    "image/png",
+                    keyvalues,
+                    image_ipfs_hash,
+                ),
+                pin_file_to_ipfs(
+                    metadata,
+                    metadata_name,
+                    "text/json",
+                    keyvalues,
+                    metadata_ipfs_hash,
+                ),
+            )
+    else:
+        # PIN image
+        with time_stage("pin"):
+            image_ipfs_hash = await pin_file_to_ipfs(
+                image,
+                image_name,
+                "image/png",
+                keyvalues,
+            )
+
+        # Create metadata
+        metadata = create_metadata(attributes, image_ipfs_hash)
+
+        with time_stage("archive"):
+            await archive_publish(traits_hex, image, metadata)
+
+        # Pin metadata
+        with time_stage("pin"):
+            metadata_ipfs_hash = await pin_file_to_ipfs(
+                metadata,
+                metadata_name,
+                "text/json",
+                keyvalues,
+            )
 
     # Convert metadata hash to Base16
     metadata_ipfs_hash_base16: str = ipfs_hash_to_base16(
@@ -355,9 +591,13 @@ def publish(
         metadata_ipfs_hash_base16,
     )
 
-    return {
+    published: PublishResponse = {
         "image_ipfs_hash": image_ipfs_hash,
         "metadata_ipfs_hash": metadata_ipfs_hash,
         "metadata_ipfs_hash_base16": metadata_ipfs_hash_base16,
         "metadata_ipfs_hash_base16_bytes32": metadata_ipfs_hash_base16_bytes32,
     }
+
+    await asyncio.to_thread(set_cached_publish, traits_hex, published)
+
+    return published
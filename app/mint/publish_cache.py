@@ -0,0 +1,123 @@
+"""
+Persistent cache of published trait combinations, shared by all workers
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+from typing import Optional, Tuple
+from .config import PUBLISH_CACHE_PATH
+from .typings import PublishResponse
+
+logger = logging.getLogger(__name__)
+
+_local = threading.local()
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Get this thread's connection to the publish cache database
+    """
+
+    connection: Optional[sqlite3.Connection] = getattr(_local, "connection", None)
+
+    if connection is None:
+        connection = sqlite3.connect(PUBLISH_CACHE_PATH, timeout=10)
+
+        # WAL lets every worker read while another one writes
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS published (
+                traits_hex TEXT PRIMARY KEY,
+                image_ipfs_hash TEXT NOT NULL,
+                metadata_ipfs_hash TEXT NOT NULL,
+                metadata_ipfs_hash_base16 TEXT NOT NULL,
+                metadata_ipfs_hash_base16_bytes32 TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        connection.commit()
+
+        _local.connection = connection
+
+    return connection
+
+
+def get_cached_publish(traits_hex: str) -> Optional[PublishResponse]:
+    """
+    Get the previously published image and metadata for a trait combination
+    """
+
+    if PUBLISH_CACHE_PATH == "":
+        return None
+
+    try:
+        row: Optional[Tuple[str, str, str, str]] = (
+            get_connection()
+            .execute(
+                """
+                SELECT
+                    image_ipfs_hash,
+                    metadata_ipfs_hash,
+                    metadata_ipfs_hash_base16,
+                    metadata_ipfs_hash_base16_bytes32
+                FROM published
+                WHERE traits_hex = ?
+                """,
+                (traits_hex.lower(),),
+            )
+            .fetchone()
+        )
+    except sqlite3.Error as error:
+        logger.warning("Failed to read publish cache: %s", error)
+        return None
+
+    if row is None:
+        return None
+
+    return {
+        "image_ipfs_hash": row[0],
+        "metadata_ipfs_hash": row[1],
+        "metadata_ipfs_hash_base16": row[2],
+        "metadata_ipfs_hash_base16_bytes32": row[3],
+    }
+
+
+def set_cached_publish(traits_hex: str, published: PublishResponse):
+    """
+    Record the published image and metadata for a trait combination
+    """
+
+    if PUBLISH_CACHE_PATH == "":
+        return
+
+    try:
+        connection: sqlite3.Connection = get_connection()
+
+        with connection:
+            connection.execute(
+                """
+                INSERT OR REPLACE INTO published (
+                    traits_hex,
+                    image_ipfs_hash,
+                    metadata_ipfs_hash,
+                    metadata_ipfs_hash_base16,
+                    metadata_ipfs_hash_base16_bytes32,
+                    created_at
+                ) VALUES (?, ?, ?, ?, ?, ?)
+                """,
+                (
+                    traits_hex.lower(),
+                    published["image_ipfs_hash"],
+                    published["metadata_ipfs_hash"],
+                    published["metadata_ipfs_hash_base16"],
+                    published["metadata_ipfs_hash_base16_bytes32"],
+                    time.time(),
+                ),
+            )
+    except sqlite3.Error as error:
+        logger.warning("Failed to write publish cache: %s", error)
@@ -0,0 +1,174 @@
+"""
+Process pool that renders images off the event loop
+"""
+
+import asyncio
+import multiprocessing
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, Union
+from ..logs import configure_logging
+from ..metrics import track_in_flight
+from .compositing import PartialStack, composite_traits, preload_layers, render_image
+from .config import RENDER_POOL_MAX_QUEUE, RENDER_POOL_PRELOAD, RENDER_POOL_SIZE
+from .typings import Traits
+
+_executor: Optional[Executor] = None
+
+render_pool_stats: Dict[str, Union[int, float]] = {
+    "in_flight": 0,
+    "completed": 0,
+    "failed": 0,
+    "rejected": 0,
+    "wait_seconds_total": 0.0,
+    "render_seconds_total": 0.0,
+    "render_seconds_max": 0.0,
+}
+
+
+def initialize_render_process():
+    """
+    Set up logging and decode every layer once when a render process starts
+    """
+
+    configure_logging()
+
+    if RENDER_POOL_PRELOAD is True:
+        preload_layers()
+
+
+def render_image_timed(
+    traits: Traits,
+    stack: Optional[PartialStack],
+) -> Tuple[bytes, float]:
+    """
+    Render an image and measure how long it took, in the render process
+    """
+
+    started_at: float = time.perf_counter()
+
+    image: bytes = render_image(traits, stack)
+
+    return image, time.perf_counter() - started_at
+
+
+def composite_stack_timed(traits: Traits) -> Tuple[bytes, float]:
+    """
+    Composite traits into raw RGB pixels to continue from later, and measure
+    how long it took, in the render process
+    """
+
+    started_at: float = time.perf_counter()
+
+    pixels: bytes = composite_traits(traits).tobytes()
+
+    return pixels, time.perf_counter() - started_at
+
+
+def get_render_executor() -> Optional[Executor]:
+    """
+    Get this worker's render process pool, or None to render in a thread
+    """
+
+    # pylint: disable=global-statement
+    global _executor
+
+    if RENDER_POOL_SIZE <= 0:
+        return None
+
+    if _executor is None:
+        # Spawn rather than fork, as workers already run helper threads
+        _executor = ProcessPoolExecutor(
+            max_workers=RENDER_POOL_SIZE,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initialize_render_process,
+        )
+
+    return _executor
+
+
+def shutdown_render_pool():
+    """
+    Stop this worker's render processes
+    """
+
+    # pylint: disable=global-statement
+    global _executor
+
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def render_image_in_pool(
+    traits: Traits,
+    stack: Optional[PartialStack] = None,
+) -> bytes:
+    """
+    Render an image as PNG in the render pool without blocking the event loop,
+    continuing from a partial stack of the first traits if given
+    """
+
+    return await run_in_render_pool(render_image_timed, traits, stack)
+
+
+async def composite_stack_in_pool(traits: Traits) -> bytes:
+    """
+    Composite traits into raw RGB pixels in the render pool, as a partial
+    stack for later renders to continue from
+    """
+
+    return await run_in_render_pool(composite_stack_timed, traits)
+
+
+async def run_in_render_pool(
+    job: Callable[..., Tuple[bytes, float]],
+    *args: Any,
+) -> bytes:
+    """
+    Run a timed render job in the render pool, counting it in the stats
+    """
+
+    if render_pool_stats["in_flight"] >= RENDER_POOL_MAX_QUEUE:
+        render_pool_stats["rejected"] += 1
+        raise Exception("Render queue is full")
+
+    loop: asyncio.AbstractEventLoop = asyncio.get_running_loop()
+
+    render_pool_stats["in_flight"] += 1
+    queued_at: float = time.perf_counter()
+
+    try:
+        with track_in_flight("render"):
+            image, render_seconds = await loop.run_in_executor(
+                get_render_executor(),
+                job,
+                *args,
+            )
+    except BaseException:
+        render_pool_stats["failed"] += 1
+        raise
+    finally:
+        render_pool_stats["in_flight"] -= 1
+
+    elapsed_seconds: float = time.perf_counter() - queued_at
+
+    render_pool_stats["completed"] += 1
+    render_pool_stats["wait_seconds_total"] += max(
+        0.0, elapsed_seconds - render_seconds
+    )
+    render_pool_stats["render_seconds_total"] += render_seconds
+    render_pool_stats["render_seconds_max"] = max(
+        render_pool_stats["render_seconds_max"],
+        render_seconds,
+    )
+
+    return image
+
+
+def get_render_pool_stats() -> Dict[str, Union[int, float]]:
+    """
+    Get render pool size, queue depth and timing counters
+    """
+
+    return {"size": RENDER_POOL_SIZE, **render_pool_stats}
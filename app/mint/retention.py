@@ -0,0 +1,238 @@
+"""
+Retention and garbage collection for the output archive
+"""
+
+import fcntl
+import logging
+import os
+import shutil
+import threading
+import time
+from typing import Dict, List, Optional, TypedDict
+from .config import (
+    ARCHIVE_KEEP_LATEST,
+    ARCHIVE_MAX_AGE,
+    ARCHIVE_MAX_BYTES,
+    ARCHIVE_SWEEP_INTERVAL,
+    MINT_RESOURCE_PATH,
+)
+
+logger = logging.getLogger(__name__)
+
+ARCHIVE_PATH: str = f"{MINT_RESOURCE_PATH}/output"
+
+
+class ArchiveRun(TypedDict):
+    path: str
+    traits_hex: str
+    timestamp: float
+    size: int
+
+
+class SweepResult(TypedDict):
+    runs: int
+    bytes: int
+    deleted_runs: int
+    deleted_bytes: int
+
+
+def get_archive_runs() -> List[ArchiveRun]:
+    """
+    List every output/<traits_hex>/<timestamp> folder, oldest first
+    """
+
+    runs: List[ArchiveRun] = []
+
+    if not os.path.isdir(ARCHIVE_PATH):
+        return runs
+
+    with os.scandir(ARCHIVE_PATH) as traits_entries:
+        for traits_entry in traits_entries:
+            if not traits_entry.is_dir(follow_symlinks=False):
+                continue
+
+            with os.scandir(traits_entry.path) as run_entries:
+                for run_entry in run_entries:
+                    if not run_entry.is_dir(follow_symlinks=False):
+                        continue
+
+                    runs.append(
+                        {
+                            "path": run_entry.path,
+                            "traits_hex": traits_entry.name,
+                            "timestamp": get_run_timestamp(run_entry),
+                            "size": get_folder_size(run_entry.path),
+                        }
+                    )
+
+    runs.sort(key=lambda run: run["timestamp"])
+
+    return runs
+
+
+def get_run_timestamp(entry: os.DirEntry) -> float:
+    """
+    Get when an archive folder was created, from its name or its mtime
+    """
+
+    try:
+        return float(entry.name)
+    except ValueError:
+        return entry.stat(follow_symlinks=False).st_mtime
+
+
+def get_folder_size(path: str) -> int:
+    """
+    Get the total size of the files in a folder
+    """
+
+    size: int = 0
+
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False):
+                size += entry.stat(follow_symlinks=False).st_size
+
+    return size
+
+
+def select_expired_runs(
+    runs: List[ArchiveRun],
+    max_bytes: int,
+    max_age: float,
+    keep_latest: int,
+) -> List[ArchiveRun]:
+    """
+    Pick the runs to delete; a limit of 0 disables that rule
+    """
+
+    expired: Dict[str, ArchiveRun] = {}
+
+    if keep_latest > 0:
+        runs_by_traits: Dict[str, List[ArchiveRun]] = {}
+
+        for run in runs:
+            runs_by_traits.setdefault(run["traits_hex"], []).append(run)
+
+        for traits_runs in runs_by_traits.values():
+            for run in traits_runs[:-keep_latest]:
+                expired[run["path"]] = run
+
+    if max_age > 0:
+        oldest_allowed: float = time.time() - max_age
+
+        for run in runs:
+            if run["timestamp"] < oldest_allowed:
+                expired[run["path"]] = run
+
+    if max_bytes > 0:
+        total_bytes: int = sum(
+            run["size"] for run in runs if run["path"] not in expired
+        )
+
+        for run in runs:
+            if total_bytes <= max_bytes:
+                break
+
+            if run["path"] not in expired:
+                expired[run["path"]] = run
+                total_bytes -= run["size"]
+
+    return list(expired.values())
+
+
+def sweep_archive(
+    max_bytes: int = ARCHIVE_MAX_BYTES,
+    max_age: float = ARCHIVE_MAX_AGE,
+    keep_latest: int = ARCHIVE_KEEP_LATEST,
+    dry_run: bool = False,
+) -> SweepResult:
+    """
+    Delete archive folders beyond the size, age and per-traits limits
+    """
+
+    runs: List[ArchiveRun] = get_archive_runs()
+    expired: List[ArchiveRun] = select_expired_runs(
+        runs,
+        max_bytes,
+        max_age,
+        keep_latest,
+    )
+
+    if dry_run is False:
+        for run in expired:
+            shutil.rmtree(run["path"], ignore_errors=True)
+
+            # Drop the traits folder once its last run is gone
+            try:
+                os.rmdir(os.path.dirname(run["path"]))
+            except OSError:
+                pass
+
+    return {
+        "runs": len(runs),
+        "bytes": sum(run["size"] for run in runs),
+        "deleted_runs": len(expired),
+        "deleted_bytes": sum(run["size"] for run in expired),
+    }
+
+
+def sweep_archive_exclusively() -> Optional[SweepResult]:
+    """
+    Sweep the archive unless another worker is already sweeping it
+    """
+
+    os.makedirs(ARCHIVE_PATH, exist_ok=True)
+
+    with open(f"{ARCHIVE_PATH}/.sweep.lock", "w", encoding="utf-8") as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            return None
+
+        try:
+            return sweep_archive()
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def run_archive_sweeper():
+    """
+    Periodically sweep the archive
+    """
+
+    while True:
+        try:
+            result: Optional[SweepResult] = sweep_archive_exclusively()
+
+            if result is not None and result["deleted_runs"] > 0:
+                logger.info("Swept archive", extra={"fields": dict(result)})
+        except Exception as error:
+            logger.warning("Failed to sweep archive: %s", error)
+
+        time.sleep(ARCHIVE_SWEEP_INTERVAL)
+
+
+_sweeper: Optional[threading.Thread] = None
+
+
+def start_archive_sweeper():
+    """
+    Start the background archive sweeper, if any retention limit is set
+    """
+
+    # pylint: disable=global-statement
+    global _sweeper
+
+    if ARCHIVE_SWEEP_INTERVAL <= 0 or _sweeper is not None:
+        return
+
+    if ARCHIVE_MAX_BYTES <= 0 and ARCHIVE_MAX_AGE <= 0 and ARCHIVE_KEEP_LATEST <= 0:
+        return
+
+    _sweeper = threading.Thread(
+        target=run_archive_sweeper,
+        name="archive-sweeper",
+        daemon=True,
+    )
+    _sweeper.start()
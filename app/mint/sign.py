@@ -2,16 +2,33 @@
 Handle signing a metadata hash and trait hex for minting
 """
 
-from eth_account import Account, messages
-from eth_account.datastructures import SignedMessage
-from web3 import Web3
+import logging
+import threading
+from typing import TYPE_CHECKING, Optional
+from eth_utils import keccak
+from ..timing import time_stage
+from ..web3_providers import get_contract
 from .config import (
     MINT_RPC_URL,
     MINT_CONTRACT_ADDRESS,
+    MINT_HASH_ENCODING,
+    MINT_HASH_SELF_TEST,
+    MINT_HASH_SOURCE,
     MINT_SIGNER_PRIVATE_KEY,
 )
 from .abi import MINT_CONTRACT_ABI
 
+# eth_account is slow to import, so it is imported when first needed
+if TYPE_CHECKING:
+    from eth_account.datastructures import SignedMessage
+
+logger = logging.getLogger(__name__)
+
+_hash_self_test_lock = threading.Lock()
+
+# None until the local hash has been checked against the contract
+_hash_self_test_passed: Optional[bool] = None
+
 
 def sign(
     approved_address: str,
@@ -22,34 +39,23 @@ def sign(
     Sign a metadata hash and trait hex for minting
     """
 
-    web3 = Web3(Web3.HTTPProvider(MINT_RPC_URL))
-
-    contract = web3.eth.contract(
-        address=Web3.toChecksumAddress(MINT_CONTRACT_ADDRESS),
-        abi=MINT_CONTRACT_ABI,
-    )
-
-    attribute_already_in_use: bool = contract.functions.tokenAttributeExists(
-        traits_bytes32,
-    ).call()
-
-    if attribute_already_in_use is True:
-        raise Exception("Attribute combination already in use")
-
-    hash_to_sign: bytes = contract.functions.getTokenURIAndAttributeHash(
+    hash_to_sign: bytes = get_token_uri_and_attribute_hash(
         approved_address,
         metadata_ipfs_hash_base16_bytes32,
         traits_bytes32,
-    ).call()
+    )
 
     if not hash_to_sign:
         raise Exception("Could not get attribute hash to sign")
 
+    # pylint: disable=import-outside-toplevel
+    from eth_account import Account, messages
+
     # This part prepares "version E" messages, using the EIP-191 standard
     message_to_sign = messages.encode_defunct(primitive=hash_to_sign)
 
     # This part signs any EIP-191-valid message
-    signature: SignedMessage = Account().sign_message(
+    signature: "SignedMessage" = Account().sign_message(
         signable_message=message_to_sign,
         private_key=MINT_SIGNER_PRIVATE_KEY,
     )
@@ -57,3 +63,144 @@ def sign(
     signature_hex_str: str = signature.signature.hex()
 
     return signature_hex_str
+
+
+def get_token_uri_and_attribute_hash(
+    approved_address: str,
+    metadata_ipfs_hash_base16_bytes32: str,
+    traits_bytes32: str,
+) -> bytes:
+    """
+    Get the hash to sign, locally unless configured to ask the contract
+    """
+
+    use_local_hash: bool = MINT_HASH_SOURCE == "local" and hash_self_test(
+        approved_address,
+        metadata_ipfs_hash_base16_bytes32,
+        traits_bytes32,
+    )
+
+    if use_local_hash is False:
+        return get_contract_token_uri_and_attribute_hash(
+            approved_address,
+            metadata_ipfs_hash_base16_bytes32,
+            traits_bytes32,
+        )
+
+    return get_local_token_uri_and_attribute_hash(
+        approved_address,
+        metadata_ipfs_hash_base16_bytes32,
+        traits_bytes32,
+    )
+
+
+def get_contract_token_uri_and_attribute_hash(
+    approved_address: str,
+    metadata_ipfs_hash_base16_bytes32: str,
+    traits_bytes32: str,
+) -> bytes:
+    """
+    Get the hash to sign from the contract's getTokenURIAndAttributeHash
+    """
+
+    contract = get_contract(
+        "http",
+        MINT_RPC_URL,
+        MINT_CONTRACT_ADDRESS,
+        MINT_CONTRACT_ABI,
+    )
+
+    with time_stage("rpc_get_token_uri_and_attribute_hash"):
+        return bytes(
+            contract.functions.getTokenURIAndAttributeHash(
+                approved_address,
+                metadata_ipfs_hash_base16_bytes32,
+                traits_bytes32,
+            ).call()
+        )
+
+
+def get_local_token_uri_and_attribute_hash(
+    approved_address: str,
+    metadata_ipfs_hash_base16_bytes32: str,
+    traits_bytes32: str,
+) -> bytes:
+    """
+    Compute getTokenURIAndAttributeHash locally
+
+    keccak256 of abi.encodePacked (MINT_HASH_ENCODING=packed) or abi.encode
+    (MINT_HASH_ENCODING=abi) of (address, bytes32, bytes32).
+    """
+
+    address_bytes: bytes = hex_to_bytes(approved_address, 20)
+
+    if MINT_HASH_ENCODING == "abi":
+        # Static types are each left padded to a 32 byte word
+        address_bytes = address_bytes.rjust(32, b"\0")
+
+    return keccak(
+        address_bytes
+        + hex_to_bytes(metadata_ipfs_hash_base16_bytes32, 32)
+        + hex_to_bytes(traits_bytes32, 32)
+    )
+
+
+def hex_to_bytes(hex_str: str, length: int) -> bytes:
+    """
+    Convert a 0x prefixed hex string into a fixed number of bytes
+    """
+
+    value: bytes = bytes.fromhex(hex_str[2:] if hex_str.startswith("0x") else hex_str)
+
+    if len(value) != length:
+        raise Exception(f"Expected {length} bytes: {hex_str}")
+
+    return value
+
+
+def hash_self_test(
+    approved_address: str,
+    metadata_ipfs_hash_base16_bytes32: str,
+    traits_bytes32: str,
+) -> bool:
+    """
+    Check the local hash against the contract once per process
+
+    On a mismatch the process keeps using the contract's hash.
+    """
+
+    # pylint: disable=global-statement
+    global _hash_self_test_passed
+
+    if MINT_HASH_SELF_TEST is False:
+        return True
+
+    if _hash_self_test_passed is not None:
+        return _hash_self_test_passed
+
+    with _hash_self_test_lock:
+        if _hash_self_test_passed is not None:
+            return _hash_self_test_passed
+
+        local_hash: bytes = get_local_token_uri_and_attribute_hash(
+            approved_address,
+            metadata_ipfs_hash_base16_bytes32,
+            traits_bytes32,
+        )
+
+        contract_hash: bytes = get_contract_token_uri_and_attribute_hash(
+            approved_address,
+            metadata_ipfs_hash_base16_bytes32,
+            traits_bytes32,
+        )
+
+        _hash_self_test_passed = local_hash == contract_hash
+
+        if _hash_self_test_passed is False:
+            logger.error(
+                "Local getTokenURIAndAttributeHash does not match the contract, "
+                "check MINT_HASH_ENCODING (%s)",
+                MINT_HASH_ENCODING,
+            )
+
+        return _hash_self_test_passed
@@ -0,0 +1,191 @@
+"""
+Coalesce concurrent publishes of the same trait combination
+
+Within a worker, requests for a combination already in flight share its
+render and pins. Across workers, a lock per combination lets one worker
+publish while the others wait, then read the result from the publish cache.
+"""
+
+import asyncio
+import fcntl
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Dict, Optional
+from ..metrics import count_cache_lookup
+from ..timing import time_stage
+from .config import (
+    PUBLISH_CACHE_PATH,
+    PUBLISH_COALESCE,
+    PUBLISH_LOCK_POLL_INTERVAL,
+    PUBLISH_LOCK_TIMEOUT,
+)
+from .typings import PublishResponse
+
+logger = logging.getLogger(__name__)
+
+# Combinations are locked as single bytes of this file, so it stays empty
+PUBLISH_LOCK_PATH: str = f"{PUBLISH_CACHE_PATH}.lock" if PUBLISH_CACHE_PATH else ""
+
+PUBLISH_LOCK_RANGE: int = 2**31 - 1
+
+
+class Flight:
+    """
+    One publish of a trait combination, shared by every request for it
+    """
+
+    def __init__(self):
+        # Resolved once any participant's gates have passed
+        self.cleared: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+        self.participants: int = 0
+        self.task: Optional[asyncio.Future[PublishResponse]] = None
+
+
+_flights: Dict[str, Flight] = {}
+
+
+def forget_flight(traits_hex: str, flight: Flight):
+    """
+    Stop handing out a flight, so later requests start a new one
+    """
+
+    if _flights.get(traits_hex) is flight:
+        del _flights[traits_hex]
+
+
+def end_flight(traits_hex: str, flight: Flight):
+    """
+    Forget a finished flight, and retrieve its outcome
+    """
+
+    forget_flight(traits_hex, flight)
+
+    # Nobody may be left to retrieve the outcome
+    if flight.task is not None and flight.task.cancelled() is False:
+        flight.task.exception()
+
+
+async def coalesce_publish(
+    traits_hex: str,
+    ready: Optional[Awaitable[None]],
+    run: Callable[[Awaitable[None]], Awaitable[PublishResponse]],
+) -> PublishResponse:
+    """
+    Join the in-flight publish of a trait combination, or start one
+
+    run is given an awaitable that completes once any participant is
+    ready, so a request that fails its own checks neither holds up nor
+    fails the others. The publish is cancelled once every participant
+    has left.
+    """
+
+    flight: Optional[Flight] = _flights.get(traits_hex)
+
+    # A finished flight is only waiting for its done callback to forget it
+    if flight is not None and flight.task.done() is True:
+        flight = None
+
+    count_cache_lookup("publish_flight", flight is not None)
+
+    if flight is None:
+        flight = Flight()
+        flight.task = asyncio.ensure_future(run(flight.cleared))
+        flight.task.add_done_callback(
+            lambda _, flight=flight: end_flight(traits_hex, flight)
+        )
+        _flights[traits_hex] = flight
+
+    flight.participants += 1
+
+    try:
+        if ready is not None:
+            await ready
+
+        if flight.cleared.done() is False:
+            flight.cleared.set_result(None)
+
+        return await asyncio.shield(flight.task)
+    finally:
+        flight.participants -= 1
+
+        if flight.participants == 0 and flight.task.done() is False:
+            # The task only finishes cancelling on a later loop turn, so
+            # requests arriving before then must not join it
+            forget_flight(traits_hex, flight)
+            flight.task.cancel()
+
+
+_lock_fd: Optional[int] = None
+
+_lock_pid: Optional[int] = None
+
+
+def get_lock_fd() -> int:
+    """
+    Get this process's descriptor of the publish lock file
+
+    POSIX record locks belong to the process and are dropped when any of
+    its descriptors of the file closes, so each process keeps one open.
+    """
+
+    # pylint: disable=global-statement
+    global _lock_fd, _lock_pid
+
+    if _lock_fd is None or _lock_pid != os.getpid():
+        _lock_fd = os.open(PUBLISH_LOCK_PATH, os.O_RDWR | os.O_CREAT, 0o644)
+        _lock_pid = os.getpid()
+
+    return _lock_fd
+
+
+def try_lock(offset: int) -> bool:
+    """
+    Lock a byte of the publish lock file, without waiting
+    """
+
+    try:
+        fcntl.lockf(get_lock_fd(), fcntl.LOCK_EX | fcntl.LOCK_NB, 1, offset)
+    except (BlockingIOError, PermissionError):
+        return False
+
+    return True
+
+
+@asynccontextmanager
+async def hold_publish_lock(traits_hex: str) -> AsyncIterator[bool]:
+    """
+    Hold the cross-worker lock of a trait combination, yielding whether it
+    was acquired
+
+    Waiting gives up after PUBLISH_LOCK_TIMEOUT, and a worker that dies
+    releases its locks, so a stuck publish only ever costs a duplicate.
+    """
+
+    if PUBLISH_COALESCE is False or PUBLISH_LOCK_PATH == "":
+        yield False
+        return
+
+    try:
+        get_lock_fd()
+    except OSError as error:
+        logger.warning("Failed to open publish lock: %s", error)
+        yield False
+        return
+
+    offset: int = int(traits_hex, 16) % PUBLISH_LOCK_RANGE
+    deadline: float = time.monotonic() + PUBLISH_LOCK_TIMEOUT
+
+    with time_stage("publish_lock"):
+        acquired: bool = try_lock(offset)
+
+        while acquired is False and time.monotonic() < deadline:
+            await asyncio.sleep(PUBLISH_LOCK_POLL_INTERVAL)
+            acquired = try_lock(offset)
+
+    try:
+        yield acquired
+    finally:
+        if acquired is True:
+            fcntl.lockf(get_lock_fd(), fcntl.LOCK_UN, 1, offset)
@@ -2,7 +2,6 @@
 Minting typings
 """
 
-import io
 from typing import Dict, Literal, TypedDict
 
 
@@ -81,7 +80,7 @@ PinataResponse = Dict[str, str]
 NFTStorageResponse = Dict[str, Dict[str, str]]
 
 
-PinataFiles = list[tuple[Literal["file"], tuple[str, io.BufferedReader, str]]]
+PinataFiles = list[tuple[Literal["file"], tuple[str, bytes, str]]]
 
 
 class PublishResponse(TypedDict):
@@ -112,3 +111,7 @@ class MintResponse(TypedDict):
     attributes: Attributes
     published: PublishResponse
     signature: str
+
+
+class MintBatchRequest(TypedDict):
+    items: list[MintRequest]
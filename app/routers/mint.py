@@ -4,12 +4,15 @@ Routes for Mint API
 
 import ast
 import json
-from typing import Dict, Union
+import logging
+from typing import Dict, List, Union
 from fastapi import APIRouter, Request, Body, HTTPException
 from .config import URL_PREFIX
-from ..mint.mint import mint
-from ..mint.typings import InputTraits, MintRequest
-from ..verification.verification import is_verified
+from ..mint.config import MINT_BATCH_MAX_ITEMS
+from ..mint.mint import MintBatchResult, mint, mint_batch
+from ..mint.typings import InputTraits, MintBatchRequest, MintRequest
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix=f"{URL_PREFIX}/mint",
@@ -31,8 +34,6 @@ def format_error(error: Union[str, Dict[str, str], Exception]):
     code = 0
     message = str(error)
 
-    print(str(error))
-
     try:
         error = ast.literal_eval(str(error))
     except Exception:
@@ -44,12 +45,22 @@ def format_error(error: Union[str, Dict[str, str], Exception]):
     if isinstance(error, dict) and ("message" in error):
         message = error["message"]
 
-    print(code)
-    print(message)
+    logger.info("Request failed: %s", message, extra={"fields": {"code": code}})
 
     return {"code": code, "message": message}
 
 
+def format_batch_result(result: MintBatchResult):
+    """
+    Format a batch item's mint response or error into returnable json
+    """
+
+    if isinstance(result, Exception):
+        return {"error": format_error(result)}
+
+    return {"data": result}
+
+
 def error400(error: Union[str, Dict[str, str], Exception]):
     """
     Handle returning a HTTP 400 error
@@ -66,6 +77,8 @@ async def mint_get(req: Request):
 
     payload: Dict[str, str] = dict(req.query_params)
 
+    logger.debug("Mint request", extra={"fields": {"payload": payload}})
+
     # Params
     # --------------------------------------------------------------------------
 
@@ -75,28 +88,19 @@ async def mint_get(req: Request):
     if "traits" not in payload:
         error400("Missing traits parameter")
 
-    # Verification
-    # --------------------------------------------------------------------------
-    try:
-        if is_verified(payload["address"]) is False:
-            raise Exception("Address is not allowed to mint")
-    except Exception as error:
-        error400(error)
-
     # Input Traits
     # --------------------------------------------------------------------------
 
     try:
         input_traits: InputTraits = json.loads(payload["traits"])
-        print(input_traits)
     except Exception:
         error400("Malformed traits parameter")
 
-    # Mint
+    # Mint (verification runs inside the mint pipeline)
     # --------------------------------------------------------------------------
 
     try:
-        mint_data = mint(payload["address"], input_traits)
+        mint_data = await mint(payload["address"], input_traits)
 
         return {"data": mint_data}
     except Exception as error:
@@ -109,7 +113,7 @@ async def mint_post(payload: MintRequest = Body(...)):
     Mint API Route (POST)
     """
 
-    print(payload)
+    logger.debug("Mint request", extra={"fields": {"payload": payload}})
 
     # Params
     # --------------------------------------------------------------------------
@@ -120,27 +124,46 @@ async def mint_post(payload: MintRequest = Body(...)):
     if "traits" not in payload:
         error400("Missing traits parameter")
 
-    # Verification
+    # Input Traits
+    # --------------------------------------------------------------------------
+
+    input_traits: InputTraits = payload["traits"]
+
+    # Mint (verification runs inside the mint pipeline)
     # --------------------------------------------------------------------------
 
     try:
-        if is_verified(payload["address"]) is False:
-            raise Exception("Address is not allowed to mint")
+        mint_data = await mint(payload["address"], input_traits)
+
+        return {"data": mint_data}
     except Exception as error:
         error400(error)
 
-    # Input Traits
+
+@router.post("/batch")
+async def mint_batch_post(payload: MintBatchRequest = Body(...)):
+    """
+    Batch Mint API Route (POST)
+
+    Items succeed or fail individually, in request order.
+    """
+
+    # Params
     # --------------------------------------------------------------------------
 
-    input_traits: InputTraits = payload["traits"]
-    print(input_traits)
+    if "items" not in payload or len(payload["items"]) == 0:
+        error400("Missing items parameter")
+
+    if len(payload["items"]) > MINT_BATCH_MAX_ITEMS:
+        error400(f"Batches are limited to {MINT_BATCH_MAX_ITEMS} items")
+
+    logger.info(
+        "Batch mint request", extra={"fields": {"items": len(payload["items"])}}
+    )
 
     # Mint
     # --------------------------------------------------------------------------
 
-    try:
-        mint_data = mint(payload["address"], input_traits)
+    results: List[MintBatchResult] = await mint_batch(payload["items"])
 
-        return {"data": mint_data}
-    except Exception as error:
-        error400(error)
+    return {"data": [format_batch_result(result) for result in results]}
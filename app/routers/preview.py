@@ -0,0 +1,115 @@
+"""
+Routes for Preview API
+"""
+
+import asyncio
+import json
+from typing import Dict
+from fastapi import APIRouter, Request, Response
+from .config import URL_PREFIX
+from .mint import error400
+from ..mint.attributes import input_traits_to_traits, traits_to_hex
+from ..mint.config import PREVIEW_MAX_AGE, PREVIEW_SIZES
+from ..mint.prerender import track_request
+from ..mint.preview import (
+    PREVIEW_MEDIA_TYPES,
+    Preview,
+    get_preview,
+    get_preview_etag,
+    get_preview_key,
+)
+from ..mint.typings import InputTraits, Traits
+
+router = APIRouter(
+    prefix=f"{URL_PREFIX}/preview",
+    tags=["preview"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+# http://localhost:5000/songadao-pfp-builder-api/preview/?traits={"base":"acapella","head":"airport","mood":"angry","beard":"beard","glasses":"hiphop","bottom":"acousticguitar","top":"baltimore"}&size=256&format=webp
+
+
+def is_etag_match(if_none_match: str, etag: str) -> bool:
+    """
+    Check an If-None-Match header against an ETag, ignoring weak markers
+    """
+
+    tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+
+    return "*" in tags or etag in tags
+
+
+@router.get("/")
+async def preview_get(req: Request):
+    """
+    Preview API Route (GET)
+    """
+
+    payload: Dict[str, str] = dict(req.query_params)
+
+    # Params
+    # --------------------------------------------------------------------------
+
+    if "traits" not in payload:
+        error400("Missing traits parameter")
+
+    try:
+        size: int = int(payload.get("size", PREVIEW_SIZES[0]))
+    except ValueError:
+        error400("Malformed size parameter")
+
+    if size not in PREVIEW_SIZES:
+        error400(f"Size must be one of {', '.join(map(str, PREVIEW_SIZES))}")
+
+    image_format: str = payload.get("format", "webp").lower()
+
+    if image_format not in PREVIEW_MEDIA_TYPES:
+        error400(f"Format must be one of {', '.join(PREVIEW_MEDIA_TYPES)}")
+
+    # Input Traits
+    # --------------------------------------------------------------------------
+
+    try:
+        input_traits: InputTraits = json.loads(payload["traits"])
+        traits: Traits = input_traits_to_traits(input_traits)
+        traits_hex: str = traits_to_hex(traits)
+    except Exception as error:
+        error400(error)
+
+    track_request(traits, traits_hex)
+
+    headers: Dict[str, str] = {
+        "Cache-Control": f"public, max-age={PREVIEW_MAX_AGE}",
+        "ETag": get_preview_etag(
+            get_preview_key(traits, traits_hex, size, image_format)
+        ),
+    }
+
+    # Conditional Request
+    # --------------------------------------------------------------------------
+
+    if is_etag_match(req.headers.get("if-none-match", ""), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    # Preview
+    # --------------------------------------------------------------------------
+
+    try:
+        preview: Preview = await asyncio.to_thread(
+            get_preview,
+            traits,
+            traits_hex,
+            size,
+            image_format,
+        )
+    except Exception as error:
+        error400(error)
+
+    headers["ETag"] = preview["etag"]
+
+    return Response(
+        content=preview["content"],
+        media_type=preview["media_type"],
+        headers=headers,
+    )
@@ -2,8 +2,9 @@
 Routes for root API
 """
 
-from fastapi import APIRouter
+from fastapi import APIRouter, Response
 from .config import URL_PREFIX
+from ..metrics import render_metrics
 
 router = APIRouter(
     prefix=f"{URL_PREFIX}",
@@ -19,3 +20,14 @@ async def root():
     """
 
     return {"message": "running"}
+
+
+@router.get("/metrics")
+async def metrics():
+    """
+    Metrics API Route (GET), in the Prometheus text format
+    """
+
+    content, media_type = render_metrics()
+
+    return Response(content=content, media_type=media_type)
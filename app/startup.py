@@ -0,0 +1,114 @@
+"""
+Boot time warm up and reporting
+
+Under gunicorn with preload_app, the app is imported once in the master
+before workers fork, so everything warmed here is shared copy-on-write.
+"""
+
+import importlib
+import logging
+import os
+import resource
+import time
+from typing import Dict, List, Optional
+from .mint.catalog import get_catalog
+from .mint.compositing import preload_layers
+from .mint.config import RENDER_POOL_SIZE
+from .mint.layer_images import get_preprocessed_layers
+
+logger = logging.getLogger(__name__)
+
+PRELOAD_ASSETS = os.environ.get("PRELOAD_ASSETS", "true").lower() == "true"
+
+# Imported lazily by the modules that use them, but warmed when preloading
+PRELOAD_MODULES: List[str] = ["web3", "eth_account"]
+
+# When this process started booting, or was forked from the master
+_started_at: float = time.perf_counter()
+
+# Process that warmed the assets, the gunicorn master when preloading
+_warmed_by: Optional[int] = None
+
+
+def reset_started_at():
+    """
+    Time a forked worker's boot from the fork
+    """
+
+    # pylint: disable=global-statement
+    global _started_at
+
+    _started_at = time.perf_counter()
+
+
+os.register_at_fork(after_in_child=reset_started_at)
+
+
+def get_max_rss_mb() -> float:
+    """
+    Get the peak resident memory of this process, in megabytes
+    """
+
+    return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+
+
+def warm_up():
+    """
+    Import slow modules, compile the catalog and decode every layer, once
+    per process, and log how long each step took
+
+    Layers are only decoded when workers render inline, as render pool
+    processes are spawned and share nothing with this one.
+    """
+
+    # pylint: disable=global-statement
+    global _warmed_by
+
+    if PRELOAD_ASSETS is False or _warmed_by is not None:
+        return
+
+    steps: Dict[str, float] = {}
+
+    def run_step(name: str, step):
+        started_at: float = time.perf_counter()
+
+        try:
+            step()
+        except Exception as error:
+            logger.warning("Failed to warm up %s: %s", name, error)
+
+        steps[f"{name}_seconds"] = round(time.perf_counter() - started_at, 3)
+
+    for module in PRELOAD_MODULES:
+        run_step(module, lambda module=module: importlib.import_module(module))
+
+    run_step("catalog", get_catalog)
+    run_step("preprocessed_index", get_preprocessed_layers)
+
+    if RENDER_POOL_SIZE <= 0:
+        run_step("layers", preload_layers)
+
+    _warmed_by = os.getpid()
+
+    logger.info(
+        "Warmed up",
+        extra={"fields": {**steps, "max_rss_mb": get_max_rss_mb()}},
+    )
+
+
+def log_worker_ready():
+    """
+    Log how long this worker took to boot and whether it shares warmed assets
+    """
+
+    logger.info(
+        "Worker ready",
+        extra={
+            "fields": {
+                "pid": os.getpid(),
+                "boot_seconds": round(time.perf_counter() - _started_at, 3),
+                "preloaded": _warmed_by is not None and _warmed_by != os.getpid(),
+                "max_rss_mb": get_max_rss_mb(),
+            }
+        },
+    )
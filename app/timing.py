@@ -0,0 +1,61 @@
+"""
+Per-request stage timings, reported in a Server-Timing response header and
+recorded as metrics
+"""
+
+import os
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Iterator, Optional
+from .metrics import observe_stage
+
+SERVER_TIMING = os.environ.get("SERVER_TIMING", "false").lower() == "true"
+
+# Stage name -> seconds, shared by every task a request starts
+stage_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar(
+    "stage_timings",
+    default=None,
+)
+
+
+def record_stage(name: str, seconds: float):
+    """
+    Add time spent in a stage to the current request's timings
+    """
+
+    timings: Optional[Dict[str, float]] = stage_timings.get()
+
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+@contextmanager
+def time_stage(name: str) -> Iterator[None]:
+    """
+    Time a block as a stage of the current request
+    """
+
+    started_at: float = time.perf_counter()
+    error: Optional[BaseException] = None
+
+    try:
+        yield
+    except BaseException as raised:
+        error = raised
+        raise
+    finally:
+        seconds: float = time.perf_counter() - started_at
+
+        record_stage(name, seconds)
+        observe_stage(name, seconds, error)
+
+
+def format_server_timing(timings: Dict[str, float]) -> str:
+    """
+    Format stage timings as a Server-Timing header value, in milliseconds
+    """
+
+    return ", ".join(
+        f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()
+    )
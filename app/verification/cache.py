@@ -0,0 +1,178 @@
+"""
+Cache of address verification results, optionally shared between workers
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional, Tuple, Union
+from ..cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+VERIFICATION_CACHE_TTL = float(os.environ.get("VERIFICATION_CACHE_TTL", "3600"))
+
+VERIFICATION_CACHE_NEGATIVE_TTL = float(
+    os.environ.get("VERIFICATION_CACHE_NEGATIVE_TTL", "60")
+)
+
+VERIFICATION_CACHE_MAX_ENTRIES = int(
+    os.environ.get("VERIFICATION_CACHE_MAX_ENTRIES", "10000")
+)
+
+VERIFICATION_CACHE_SHARED_PATH = os.environ.get("VERIFICATION_CACHE_SHARED_PATH", "")
+
+verification_cache: LRUCache[bool] = LRUCache(VERIFICATION_CACHE_MAX_ENTRIES)
+
+shared_stats: Dict[str, int] = {"hits": 0, "misses": 0}
+
+_local = threading.local()
+
+
+def get_cached_verification(address: str) -> Optional[bool]:
+    """
+    Get a cached verification result for an address
+    """
+
+    key: str = address.lower()
+
+    verified: Optional[bool] = verification_cache.get(key)
+
+    if verified is not None or VERIFICATION_CACHE_SHARED_PATH == "":
+        return verified
+
+    verified = get_shared_verification(key)
+
+    if verified is None:
+        shared_stats["misses"] += 1
+        return None
+
+    shared_stats["hits"] += 1
+
+    # Don't let the local copy outlive the shared entry by a full ttl
+    verification_cache.set(key, verified, ttl=get_ttl(verified) / 2)
+
+    return verified
+
+
+def set_cached_verification(address: str, verified: bool):
+    """
+    Cache a verification result, with a shorter ttl for unverified addresses
+    """
+
+    key: str = address.lower()
+    ttl: float = get_ttl(verified)
+
+    verification_cache.set(key, verified, ttl=ttl)
+
+    if VERIFICATION_CACHE_SHARED_PATH != "":
+        set_shared_verification(key, verified, ttl)
+
+
+def get_ttl(verified: bool) -> float:
+    """
+    Get the cache ttl of a verification result
+    """
+
+    return VERIFICATION_CACHE_TTL if verified else VERIFICATION_CACHE_NEGATIVE_TTL
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Get this thread's connection to the shared verification cache
+    """
+
+    connection: Optional[sqlite3.Connection] = getattr(_local, "connection", None)
+
+    if connection is None:
+        connection = sqlite3.connect(VERIFICATION_CACHE_SHARED_PATH, timeout=10)
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS verification (
+                address TEXT PRIMARY KEY,
+                verified INTEGER NOT NULL,
+                expires_at REAL NOT NULL
+            )
+            """
+        )
+        connection.commit()
+
+        _local.connection = connection
+
+    return connection
+
+
+def get_shared_verification(key: str) -> Optional[bool]:
+    """
+    Get an unexpired verification result from the shared cache
+    """
+
+    try:
+        row: Optional[Tuple[int]] = (
+            get_connection()
+            .execute(
+                """
+                SELECT verified FROM verification
+                WHERE address = ? AND expires_at > ?
+                """,
+                (key, time.time()),
+            )
+            .fetchone()
+        )
+    except sqlite3.Error as error:
+        logger.warning("Failed to read verification cache: %s", error)
+        return None
+
+    if row is None:
+        return None
+
+    return row[0] == 1
+
+
+def set_shared_verification(key: str, verified: bool, ttl: float):
+    """
+    Store a verification result in the shared cache
+    """
+
+    try:
+        connection: sqlite3.Connection = get_connection()
+
+        with connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO verification VALUES (?, ?, ?)",
+                (key, 1 if verified else 0, time.time() + ttl),
+            )
+
+            # Keep the table bounded by dropping expired rows as we go
+            connection.execute(
+                "DELETE FROM verification WHERE expires_at <= ?",
+                (time.time(),),
+            )
+    except sqlite3.Error as error:
+        logger.warning("Failed to write verification cache: %s", error)
+
+
+def get_verification_cache_stats() -> Dict[str, Union[int, float]]:
+    """
+    Get verification cache counters and hit ratio
+    """
+
+    stats: Dict[str, Union[int, float]] = {
+        **verification_cache.stats(),
+        "shared_hits": shared_stats["hits"],
+        "shared_misses": shared_stats["misses"],
+    }
+
+    lookups: int = verification_cache.hits + verification_cache.misses
+
+    stats["hit_ratio"] = (
+        (verification_cache.hits + shared_stats["hits"]) / lookups
+        if lookups > 0
+        else 0.0
+    )
+
+    return stats
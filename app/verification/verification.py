@@ -3,7 +3,11 @@ Handle checking if the minting address is allowed to mint.
 """
 
 import os
-from web3 import Web3
+from typing import Optional
+from ..metrics import count_cache_lookup
+from ..timing import time_stage
+from ..web3_providers import get_contract
+from .cache import get_cached_verification, set_cached_verification
 
 VERIFICATION_RPC_URL = os.environ["VERIFICATION_RPC_URL"]
 VERIFICATION_CONTRACT_ADDRESS = os.environ["VERIFICATION_CONTRACT_ADDRESS"]
@@ -18,24 +22,52 @@ VERIFICATION_CONTRACT_ABI = [
 ]
 
 
-def is_verified(address: str) -> bool:
+def validate_address(address: str):
     """
-    Check if the address is verified.
+    Check that the address is well formed, without any network calls.
     """
 
+    # pylint: disable=import-outside-toplevel
+    from web3 import Web3
+
     if Web3.isAddress(address) is False:
         raise Exception("Verification address is not a valid address")
 
+
+def is_verified(address: str) -> bool:
+    """
+    Check if the address is verified.
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from web3 import Web3
+
+    validate_address(address)
+
     if VERIFICATION_RPC_URL == "" or VERIFICATION_CONTRACT_ADDRESS == "":
         return True
 
-    web3 = Web3(Web3.WebsocketProvider(VERIFICATION_RPC_URL))
+    # Cache and check every spelling of an address as the one the contract
+    # accepts, so a lowercase address doesn't pass only when it is cached
+    address = Web3.toChecksumAddress(address)
+
+    cached_verified: Optional[bool] = get_cached_verification(address)
 
-    contract = web3.eth.contract(
-        address=Web3.toChecksumAddress(VERIFICATION_CONTRACT_ADDRESS),
-        abi=VERIFICATION_CONTRACT_ABI,
+    count_cache_lookup("verification", cached_verified is not None)
+
+    if cached_verified is not None:
+        return cached_verified
+
+    contract = get_contract(
+        "websocket",
+        VERIFICATION_RPC_URL,
+        VERIFICATION_CONTRACT_ADDRESS,
+        VERIFICATION_CONTRACT_ABI,
     )
 
-    is_verified_user: bool = contract.functions.isVerifiedUser(address).call()
+    with time_stage("rpc_is_verified_user"):
+        is_verified_user: bool = contract.functions.isVerifiedUser(address).call()
+
+    set_cached_verification(address, is_verified_user is True)
 
     return is_verified_user is True
@@ -0,0 +1,203 @@
+"""
+Long lived, lazily created Web3 providers and contracts, shared per worker
+"""
+
+import logging
+import os
+import threading
+import time
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
+import requests
+from requests.adapters import HTTPAdapter
+
+# web3 is slow to import, so it is imported when first needed
+if TYPE_CHECKING:
+    from web3 import Web3
+    from web3.contract import Contract
+
+logger = logging.getLogger(__name__)
+
+RPC_TIMEOUT = float(os.environ.get("RPC_TIMEOUT", "30"))
+
+RPC_POOL_SIZE = int(os.environ.get("RPC_POOL_SIZE", "20"))
+
+RPC_HEALTH_CHECK_INTERVAL = float(os.environ.get("RPC_HEALTH_CHECK_INTERVAL", "30"))
+
+# (transport, url)
+ProviderKey = Tuple[str, str]
+
+_providers: Dict[ProviderKey, "Web3"] = {}
+
+_provider_checked_at: Dict[ProviderKey, float] = {}
+
+_contracts: Dict[Tuple[str, str, str], "Contract"] = {}
+
+_checksum_addresses: Dict[str, str] = {}
+
+_lock = threading.Lock()
+
+
+def serialize_requests(provider: Any) -> Any:
+    """
+    Let one request at a time use a provider's connection
+
+    A websocket provider sends and receives on a single socket, so requests
+    from concurrent threads would read each other's responses.
+    """
+
+    lock = threading.Lock()
+    make_request = provider.make_request
+
+    def make_serialized_request(method: str, params: Any) -> Any:
+        with lock:
+            return make_request(method, params)
+
+    provider.make_request = make_serialized_request
+
+    return provider
+
+
+def create_web3(key: ProviderKey) -> "Web3":
+    """
+    Create a Web3 instance for a transport and url
+    """
+
+    # pylint: disable=import-outside-toplevel
+    from web3 import Web3
+
+    transport, url = key
+
+    if transport == "websocket":
+        # The provider keeps one socket open and reconnects after a failure
+        return Web3(
+            serialize_requests(
+                Web3.WebsocketProvider(url, websocket_timeout=int(RPC_TIMEOUT)),
+            ),
+        )
+
+    session: requests.Session = requests.Session()
+    adapter: HTTPAdapter = HTTPAdapter(
+        pool_connections=RPC_POOL_SIZE,
+        pool_maxsize=RPC_POOL_SIZE,
+    )
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+
+    return Web3(
+        Web3.HTTPProvider(
+            url,
+            request_kwargs={"timeout": RPC_TIMEOUT},
+            session=session,
+        ),
+    )
+
+
+def get_web3(transport: str, url: str) -> "Web3":
+    """
+    Get the shared Web3 instance for a transport and url
+
+    The connection is health checked at most once per interval and replaced
+    when the check fails.
+    """
+
+    key: ProviderKey = (transport, url)
+
+    now: float = time.monotonic()
+
+    with _lock:
+        web3: Optional["Web3"] = _providers.get(key)
+
+        if web3 is None:
+            web3 = create_web3(key)
+            _providers[key] = web3
+            _provider_checked_at[key] = now
+
+            return web3
+
+        if now - _provider_checked_at[key] < RPC_HEALTH_CHECK_INTERVAL:
+            return web3
+
+        _provider_checked_at[key] = now
+
+    if is_healthy(web3) is True:
+        return web3
+
+    logger.warning("Reconnecting unhealthy %s RPC provider", transport)
+
+    with _lock:
+        web3 = create_web3(key)
+        _providers[key] = web3
+
+        # Cached contracts are bound to the replaced provider
+        for contract_key in [k for k in _contracts if k[:2] == key]:
+            del _contracts[contract_key]
+
+    return web3
+
+
+def is_healthy(web3: "Web3") -> bool:
+    """
+    Check if a provider can reach its node
+    """
+
+    try:
+        return web3.isConnected() is True
+    except Exception:
+        return False
+
+
+def get_http_web3(url: str) -> "Web3":
+    """
+    Get the shared Web3 instance for an HTTP RPC url
+    """
+
+    return get_web3("http", url)
+
+
+def get_websocket_web3(url: str) -> "Web3":
+    """
+    Get the shared Web3 instance for a websocket RPC url
+    """
+
+    return get_web3("websocket", url)
+
+
+def to_checksum_address(address: str) -> str:
+    """
+    Get the checksummed form of an address, cached
+    """
+
+    checksum_address: str = _checksum_addresses.get(address, "")
+
+    if checksum_address == "":
+        # pylint: disable=import-outside-toplevel
+        from web3 import Web3
+
+        checksum_address = Web3.toChecksumAddress(address)
+        _checksum_addresses[address] = checksum_address
+
+    return checksum_address
+
+
+def get_contract(
+    transport: str,
+    url: str,
+    address: str,
+    abi: List[Dict[str, Any]],
+) -> "Contract":
+    """
+    Get the shared contract instance for an RPC url and address
+    """
+
+    web3: "Web3" = get_web3(transport, url)
+
+    key: Tuple[str, str, str] = (transport, url, address)
+
+    with _lock:
+        contract: "Contract" = _contracts.get(key) or web3.eth.contract(
+            address=to_checksum_address(address),
+            abi=abi,
+        )
+        _contracts[key] = contract
+
+    return contract
@@ -0,0 +1,30 @@
+"""
+Gunicorn settings and server hooks
+"""
+
+import gc
+import os
+
+# Import the app once in the master so workers share it copy-on-write
+preload_app = os.environ.get("GUNICORN_PRELOAD", "true").lower() == "true"
+
+
+def pre_fork(_server, _worker):
+    """
+    Keep the garbage collector from touching the master's objects in
+    workers, which would copy their shared pages
+    """
+
+    gc.freeze()
+
+
+def child_exit(_server, worker):
+    """
+    Drop a stopped worker's live gauges from the shared metrics
+    """
+
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        # pylint: disable=import-outside-toplevel
+        from prometheus_client import multiprocess
+
+        multiprocess.mark_process_dead(worker.pid)